@@ -0,0 +1,215 @@
+#Benchmark.py
+
+"""
+    El siguiente codigo mide el rendimiento de las operaciones mas costosas del proyecto.
+    * Se mide generate_keys, sign y verify (con cada esquema de firma), los hashes por segundo de good_nonce (y del motor
+    de minado), Tx.is_valid segun la cantidad de entradas y de firmantes, TxBlock.is_valid segun
+    el tamaño del bloque y la cantidad de hilos, la validacion de cadenas completas y la contabilidad
+    de muchos bloques (recorriendo las tuplas o con las columnas de Columnar.py).
+    * Todo corre sin red y con cantidades fijas de repeticiones, cada medicion reporta el mejor
+    tiempo de REPEATS ejecuciones.
+    * Los resultados se escriben en JSON para poder comparar versiones y detectar regresiones:
+        python Benchmark.py resultados.json
+"""
+import json
+import platform
+import sys
+import time
+
+import Signatures
+import Columnar
+from Signatures import generate_keys
+from Transactions import Tx
+from TxBlock import TxBlock
+from ChainValidator import ChainValidator
+
+# Tamaños de bloque (cantidad de transacciones) y cantidad de hilos a medir
+BLOCK_SIZES = (10, 50, 200)
+WORKERS = (1, 2, 4, 8)
+# Cantidad de entradas y de firmantes distintos de una transaccion
+TX_INPUTS = (1, 4, 16)
+TX_SIGNERS = (1, 2, 4)
+# Largos de cadena a validar
+CHAIN_LENGTHS = (10, 50)
+# Cantidad de veces que se repite cada medicion, se reporta la mejor
+REPEATS = 3
+
+
+# Crea un bloque con n transacciones firmadas, usando un conjunto pequeño de claves
+def make_block(n, keys, previousBlock=None):
+    block = TxBlock(previousBlock)
+    for i in range(n):
+        pr_from, pu_from = keys[i % len(keys)]
+        pr_to, pu_to = keys[(i + 1) % len(keys)]
+        tx = Tx()
+        tx.add_input(pu_from, 1)
+        tx.add_output(pu_to, 1)
+        tx.sign(pr_from)
+        block.addTx(tx)
+    return block
+
+# Crea una transaccion con n entradas repartidas entre los primeros `signers` pares de claves
+def make_tx(inputs, signers, keys):
+    tx = Tx()
+    for i in range(inputs):
+        tx.add_input(keys[i % signers][1], 1)
+    tx.add_output(keys[0][1], inputs)
+    for pr, pu in keys[:signers]:
+        tx.sign(pr)
+    return tx
+
+# Mejor tiempo (en segundos) de REPEATS ejecuciones de func
+def best_time(func, repeats=REPEATS):
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# Resultado de una medicion de n operaciones
+def rate(name, n, elapsed, **params):
+    result = {'name': name, 'ops': n, 'seconds': elapsed,
+              'ops_per_second': n / elapsed if elapsed > 0 else 0.0}
+    result.update(params)
+    return result
+
+# Claves usadas por las mediciones (se generan una sola vez)
+def make_keys(n=4):
+    return [generate_keys() for i in range(n)]
+
+
+def bench_generate_keys(n=5, scheme=Signatures.DEFAULT_SCHEME):
+    elapsed = best_time(lambda: [generate_keys(scheme) for i in range(n)])
+    return [rate('generate_keys', n, elapsed, scheme=scheme)]
+
+def bench_sign_verify(keys, n=50):
+    pr, pu = keys[0]
+    scheme = Signatures.scheme_for_address(pu).name
+    message = b'benchmark message'
+    sig = Signatures.sign(message, pr)
+    return [
+        rate('sign', n, best_time(lambda: [Signatures.sign(message, pr) for i in range(n)]), scheme=scheme),
+        rate('verify', n, best_time(lambda: [Signatures.verify(message, sig, pu) for i in range(n)]), scheme=scheme),
+    ]
+
+# Hashes por segundo de good_nonce (hash completo de la cabecera) y del motor de minado
+def bench_mining(keys, n=20000):
+    block = make_block(10, keys)
+
+    def good_nonce():
+        for nonce in range(n):
+            block.nonce = nonce
+            block.good_nonce()
+
+    engine = block.hash_engine()
+    return [
+        rate('good_nonce', n, best_time(good_nonce)),
+        rate('hash_engine', n, best_time(lambda: engine.search(0, n))),
+    ]
+
+# Tx.is_valid segun la cantidad de entradas y de firmantes
+def bench_tx_validation(keys, inputs=TX_INPUTS, signers=TX_SIGNERS):
+    results = []
+    for s in signers:
+        if s > len(keys):
+            continue
+        for n in inputs:
+            tx = make_tx(n, s, keys)
+            results.append(rate('tx_is_valid', 1, best_time(tx.is_valid), inputs=n, signers=s))
+    return results
+
+# Mide TxBlock.is_valid para cada tamaño de bloque y cantidad de hilos
+def bench_parallel_validation(sizes=BLOCK_SIZES, workers=WORKERS, keys=None):
+    if keys is None:
+        keys = make_keys()
+    results = []
+    for size in sizes:
+        block = make_block(size, keys)
+        base = None
+        for w in workers:
+            elapsed = best_time(lambda: block.is_valid(workers=w))
+            if base is None:
+                base = elapsed
+            results.append({
+                'name': 'block_is_valid',
+                'block_size': size,
+                'workers': w,
+                'seconds': elapsed,
+                'tx_per_second': size / elapsed if elapsed > 0 else 0.0,
+                'speedup': base / elapsed if elapsed > 0 else 0.0,
+            })
+    return results
+
+# Validacion de cadenas completas (sin checkpoint, se validan todos los bloques)
+def bench_chain_validation(keys, lengths=CHAIN_LENGTHS, block_size=10):
+    results = []
+    for length in lengths:
+        tip = None
+        for i in range(length):
+            tip = make_block(block_size, keys, tip)
+        elapsed = best_time(lambda: ChainValidator().validate(tip))
+        results.append(rate('chain_validation', length, elapsed, blocks=length, block_size=block_size))
+    return results
+
+# Totales de entradas y salidas de muchos bloques: recorriendo las tuplas de cada
+# transaccion o con las columnas de Columnar.py (ya armadas)
+def bench_accounting(keys, blocks=100, block_size=100):
+    chain = [make_block(block_size, keys) for i in range(blocks)]
+
+    def tuple_loop():
+        total_in = 0
+        total_out = 0
+        for block in chain:
+            for tx in block.data:
+                for addr, amount in tx.inputs:
+                    total_in = total_in + amount
+                for addr, amount in tx.outputs:
+                    total_out = total_out + amount
+        return total_in, total_out
+
+    columns = Columnar.TxColumns.from_blocks(chain)
+    backend = 'numpy' if Columnar.numpy is not None else 'array'
+    n = blocks * block_size
+    return [
+        rate('accounting_tuples', n, best_time(tuple_loop), blocks=blocks),
+        rate('accounting_columns', n, best_time(columns.totals), blocks=blocks, backend=backend),
+        rate('accounting_block_fees', n, best_time(columns.block_fees), blocks=blocks, backend=backend),
+    ]
+
+# Corre todas las mediciones y retorna el reporte
+def run_all():
+    keys = make_keys()
+    results = []
+    for scheme in Signatures.SCHEMES:
+        results += bench_generate_keys(scheme=scheme)
+        results += bench_sign_verify([generate_keys(scheme)])
+    results += bench_mining(keys)
+    results += bench_tx_validation(keys)
+    results += bench_parallel_validation(keys=keys)
+    results += bench_chain_validation(keys)
+    results += bench_accounting(keys)
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeats': REPEATS,
+        'results': results,
+    }
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    report = run_all()
+    for r in report['results']:
+        params = ", ".join(k + "=" + str(v) for k, v in r.items()
+                           if k not in ('name', 'ops', 'seconds', 'ops_per_second'))
+        print("%-18s %10.6f s  %s" % (r['name'], r['seconds'], params or str(int(r['ops_per_second'])) + " ops/s"))
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "benchmark.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to " + path)
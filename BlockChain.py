@@ -6,8 +6,14 @@
 	y una referencia al bloque anterior.
 	
 """
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
+import Encoding
+
+# Campos de un bloque que no se pueden modificar una vez sellado
+SEALED_FIELDS = ('data', 'previousHash', 'nonce')
+
+# Error que se lanza al intentar modificar un bloque sellado
+class SealedBlockError(Exception):
+	pass
 
 # Tipo de dato compuesto
 class someClass:
@@ -27,6 +33,11 @@ class CBlock:
 	previousBlock = None
 	# y los datos de este bloque
 	data = None
+	# Un bloque sellado es inmutable y guarda su hash ya calculado
+	# (las subclases agregan a sealed_fields los campos que cubre su hash)
+	sealed_fields = SEALED_FIELDS
+	sealed = False
+	cachedHash = None
 
 	# constructor
 	def __init__(self, data, previousBlock):
@@ -39,20 +50,56 @@ class CBlock:
 			self.previousHash = previousBlock.computeHash()
 
 	
+	# datos del bloque en bytes, los datos de un CBlock son genericos asi que se usa su str
+	# (las subclases como TxBlock definen su propia codificacion)
+	def encode_data(self):
+		return bytes(str(self.data), 'utf-8')
+
+	# codificacion binaria del bloque: version + datos + hash anterior (ver Encoding.py)
+	def encode(self):
+		return Encoding.encode_block(self.encode_data(), self.previousHash)
+
 	# funcion encargada de calcular el hash para este bloque
 	# El hash de este bloque es una composicion del hash del bloque anterior + los datos        
+	# Si el bloque esta sellado se retorna el hash guardado sin recalcularlo
 	def computeHash(self):
-		digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-		digest.update(bytes(str(self.data), 'utf-8'))
-		digest.update(bytes(str(self.previousHash), 'utf-8'))
-		return digest.finalize()
+		if self.sealed:
+			return self.cachedHash
+		return Encoding.sha256(self.encode())
+
+	# Sella el bloque: calcula su hash una sola vez y desde entonces no se puede modificar
+	# data, previousHash ni nonce. Si los datos son una lista se guardan como tupla para
+	# que tampoco se puedan modificar en el lugar
+	def seal(self):
+		if self.sealed:
+			return self.cachedHash
+		if isinstance(self.data, list):
+			self.data = tuple(self.data)
+		object.__setattr__(self, 'cachedHash', self.computeHash())
+		object.__setattr__(self, 'sealed', True)
+		return self.cachedHash
+
+	# Quita el sello e invalida explicitamente el hash guardado
+	def unseal(self):
+		object.__setattr__(self, 'sealed', False)
+		object.__setattr__(self, 'cachedHash', None)
+		if isinstance(self.data, tuple):
+			self.data = list(self.data)
+
+	# Impide modificar los campos que forman el hash de un bloque sellado
+	def __setattr__(self, name, value):
+		if self.sealed and name in self.sealed_fields:
+			raise SealedBlockError("Block is sealed, unseal() it before changing " + name)
+		object.__setattr__(self, name, value)
 
 	# funcion encargada de comprobar si un determinado bloque es valido..
 	# Un bloque es valido si al calcular nuevamente el hash del bloque anterior, el resultado
-	# es igual al hash anterior almacenado en este bloque como previusHash
+	# es igual al hash anterior almacenado en este bloque como previusHash.
+	# Un bloque sin bloque anterior solo es valido si es el primero (sin previousHash), un bloque
+	# desenlazado (por ejemplo el de BlockStore.get) no se puede validar
 	def is_valid(self):
 		if self.previousBlock is None:
-			return True					#si es el primer bloque, es valido
+			return self.previousHash is None		#si es el primer bloque, es valido
 		return self.previousBlock.computeHash() == self.previousHash
 
 
@@ -126,6 +173,26 @@ if __name__ == '__main__':
 	else:
 		print("Success! Tampering detected.")
 
+	print("\n\n############# SEALED BLOCKS ###############\n\n")
+
+	# Un bloque sellado guarda su hash y no permite modificar sus datos
+	B6.seal()
+	try:
+		B6.data = "tampered"
+		print("ERROR! Sealed block was modified")
+	except SealedBlockError:
+		print("Success! Sealed block can not be modified")
+
+	if B6.computeHash() == B6.cachedHash:
+		print("Success! Sealed block hash is cached")
+
+	# al quitar el sello se puede modificar, y el hash se vuelve a calcular
+	sealedHash = B6.cachedHash
+	B6.unseal()
+	B6.data = "tampered"
+	if B6.cachedHash is None and B6.computeHash() != sealedHash:
+		print("Success! Unsealed block hash recomputed")
+
 """
 B5.data.num = 23678
 	if B6.previousBlock.computeHash() == B6.previousHash:
@@ -0,0 +1,182 @@
+#BlockStore.py
+
+"""
+    El siguiente codigo modela un almacen de bloques en disco, de solo agregar (append-only).
+    * Guardar un bloque con pickle.dump guarda tambien toda la cadena, porque previousBlock es una
+    referencia al bloque anterior. Con cadenas largas se supera el limite de recursion de Python y cada
+    guardado reescribe todo.
+    * Aqui cada bloque se guarda por separado, sin la referencia al bloque anterior (el enlace queda
+    en previousHash), como un registro con prefijo de longitud:
+        [longitud del bloque: 4 bytes][hash del bloque: 32 bytes][bloque serializado]
+    * Al abrir el almacen solo se leen las cabeceras de los registros (via mmap) para construir los
+    indices por altura y por hash, los bloques se deserializan solo cuando se piden.
+"""
+import copy
+import mmap
+import os
+import pickle
+import struct
+
+import Difficulty
+
+_header = struct.Struct('>I32s')
+# Cantidad de bloques anteriores que enlaza get_linked: los que necesitan Difficulty.next_target
+# (el bloque anterior y RETARGET_INTERVAL bloques mas) y Difficulty.median_time_past
+LINK_DEPTH = max(Difficulty.RETARGET_INTERVAL + 1, Difficulty.MEDIAN_SPAN)
+
+
+class BlockStore:
+
+    def __init__(self, path):
+        self.path = path
+        # posicion en el archivo de cada bloque, indexada por altura
+        self.offsets = []
+        # altura de cada bloque, indexada por su hash
+        self.heights = {}
+        self._map = None
+
+        # se crea el archivo si no existe
+        open(path, "ab").close()
+        self.file = open(path, "r+b")
+        self.__scan()
+
+    # Recorre las cabeceras de los registros para construir los indices.
+    # Si el ultimo registro quedo a medio escribir (por ejemplo por un corte) se descarta
+    def __scan(self):
+        data = self.__mapped()
+        size = len(data) if data is not None else 0
+        offset = 0
+        while offset + _header.size <= size:
+            length, block_hash = _header.unpack_from(data, offset)
+            if offset + _header.size + length > size:
+                break
+            self.heights[block_hash] = len(self.offsets)
+            self.offsets.append(offset)
+            offset = offset + _header.size + length
+        if offset < size:
+            self.__unmap()
+            self.file.truncate(offset)
+
+    # Vista mmap del archivo, se vuelve a crear despues de agregar bloques
+    def __mapped(self):
+        if self._map is None and os.path.getsize(self.path) > 0:
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Hash del ultimo bloque guardado
+    def tip_hash(self):
+        if not self.offsets:
+            return None
+        return self.block_hash(len(self.offsets) - 1)
+
+    # Agrega un bloque al final del almacen, el bloque debe ser hijo del ultimo bloque guardado.
+    # Retorna la altura del bloque
+    def append(self, block):
+        if block.previousHash != self.tip_hash():
+            raise ValueError("Block does not extend the stored chain")
+
+        # se guarda una copia del bloque sin la referencia al bloque anterior
+        detached = copy.copy(block)
+        object.__setattr__(detached, 'previousBlock', None)
+        payload = pickle.dumps(detached)
+        block_hash = block.computeHash()
+
+        self.file.seek(0, os.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(_header.pack(len(payload), block_hash))
+        self.file.write(payload)
+        self.file.flush()
+        self.__unmap()
+
+        self.heights[block_hash] = len(self.offsets)
+        self.offsets.append(offset)
+        return len(self.offsets) - 1
+
+    # Retorna el bloque a la altura dada, sin su bloque anterior (previousBlock = None).
+    # Salvo el primer bloque, un bloque desenlazado no se puede validar (is_valid retorna False):
+    # para validar usar get_linked o ChainReader
+    def get(self, height):
+        data = self.__mapped()
+        offset = self.offsets[height]
+        length, block_hash = _header.unpack_from(data, offset)
+        start = offset + _header.size
+        return pickle.loads(data[start:start + length])
+
+    # Hash guardado del bloque a la altura dada (solo se lee la cabecera del registro)
+    def block_hash(self, height):
+        return _header.unpack_from(self.__mapped(), self.offsets[height])[1]
+
+    # Altura de un bloque dado su hash (None si no esta guardado)
+    def height_of(self, block_hash):
+        return self.heights.get(block_hash)
+
+    def get_by_hash(self, block_hash):
+        return self.get(self.heights[block_hash])
+
+    # Retorna el bloque enlazado con sus depth bloques anteriores, suficiente para que is_valid
+    # pueda comprobar el hash del bloque anterior, el objetivo de dificultad y el timestamp
+    def get_linked(self, height, depth=LINK_DEPTH):
+        block = self.get(height)
+        child = block
+        for previous in range(height - 1, max(-1, height - 1 - depth), -1):
+            parent = self.get(previous)
+            object.__setattr__(child, 'previousBlock', parent)
+            child = parent
+        return block
+
+    def close(self):
+        self.__unmap()
+        self.file.close()
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    from BlockChain import CBlock
+
+    if os.path.exists("blocks.dat"):
+        os.remove("blocks.dat")
+
+    # Guardamos una cadena de 1000 bloques, mas de lo que pickle puede guardar de una vez
+    store = BlockStore("blocks.dat")
+    block = None
+    for i in range(1000):
+        block = CBlock("block " + str(i), block)
+        store.append(block)
+    tip_hash = block.computeHash()
+    store.close()
+
+    # Al abrir nuevamente solo se leen las cabeceras
+    store = BlockStore("blocks.dat")
+    if len(store) == 1000 and store.tip_hash() == tip_hash:
+        print("Success! Store reopened with " + str(len(store)) + " blocks")
+    else:
+        print("ERROR! Store index is wrong")
+
+    loaded = store.get_linked(store.height_of(tip_hash))
+    if loaded.data == "block 999" and loaded.is_valid():
+        print("Success! Loaded block is valid")
+    else:
+        print("ERROR! Loaded block is invalid")
+
+    # Sin enlazar no se puede comprobar el hash del bloque anterior
+    if not store.get(999).is_valid() and store.get(0).is_valid():
+        print("Success! Unlinked block is not valid")
+    else:
+        print("ERROR! Unlinked block is valid")
+
+    # Un bloque que no extiende la cadena guardada se rechaza
+    try:
+        store.append(CBlock("orphan", None))
+        print("ERROR! Orphan block stored")
+    except ValueError:
+        print("Success! Orphan block rejected")
+    store.close()
@@ -0,0 +1,204 @@
+#BlockTree.py
+
+"""
+    El siguiente codigo modela el arbol de bloques, con todas las ramas (forks) de la cadena.
+    * Un bloque solo guarda una referencia a su bloque anterior, asi que encontrar sus hermanos o
+    la punta de la mejor rama requiere recorrer todo. Aqui se indexan los hijos de cada bloque por
+    el hash del padre, y para cada bloque se guarda su altura y el trabajo acumulado de su rama.
+    * La punta (tip) de la mejor rama se mantiene actualizada al agregar bloques: es la de mayor
+    trabajo acumulado (ante un empate se mantiene la que llego primero).
+    * Al cambiar a una rama mas pesada (reorg) solo se recorren los bloques entre el punto de
+    bifurcacion y las dos puntas, y si hay un Ledger se desconectan y aplican solo esos bloques.
+    * Si un bloque no se puede aplicar al Ledger se marca como invalido junto con todos sus
+    descendientes, y las ramas invalidas no se vuelven a considerar para la punta.
+"""
+import Difficulty
+
+
+# Trabajo que aporta un bloque a su rama: la cantidad esperada de hashes para minarlo segun su
+# objetivo de dificultad (los bloques sin objetivo, como los CBlock, cuentan 1)
+def block_work(block):
+    target = getattr(block, 'target', None)
+    if target is None:
+        return 1
+    return Difficulty.work(target)
+
+
+# Un bloque dentro del arbol
+class BlockEntry:
+
+    def __init__(self, block, block_hash, parent, height, work):
+        self.block = block
+        self.hash = block_hash
+        self.parent = parent
+        self.height = height
+        self.work = work
+        # un bloque es invalido si no se pudo aplicar al Ledger (o su padre es invalido)
+        self.invalid = parent is not None and parent.invalid
+
+
+class BlockTree:
+
+    def __init__(self, ledger=None):
+        # bloques indexados por su hash
+        self.entries = {}
+        # hashes de los hijos de cada bloque, indexados por el hash del padre
+        self.children = {}
+        # punta de la mejor rama
+        self.tip = None
+        # ledger que se mantiene sincronizado con la mejor rama (opcional)
+        self.ledger = ledger
+        # bloques desconectados y conectados en el ultimo cambio de punta
+        self.last_reorg = ([], [])
+
+    def __contains__(self, block_hash):
+        return block_hash in self.entries
+
+    def get(self, block_hash):
+        return self.entries.get(block_hash)
+
+    # Bloques hijos de un bloque (sus hermanos entre si)
+    def children_of(self, block_hash):
+        return [self.entries[h] for h in self.children.get(block_hash, [])]
+
+    # Agrega un bloque al arbol, su padre ya debe estar en el arbol (salvo el bloque root).
+    # Retorna la entrada del bloque
+    def add(self, block):
+        block_hash = block.computeHash()
+        if block_hash in self.entries:
+            return self.entries[block_hash]
+
+        parent = None
+        if block.previousHash is not None:
+            parent = self.entries.get(block.previousHash)
+            if parent is None:
+                raise ValueError("Parent block is not in the tree")
+
+        height = parent.height + 1 if parent is not None else 0
+        work = (parent.work if parent is not None else 0) + block_work(block)
+        entry = BlockEntry(block, block_hash, parent, height, work)
+        self.entries[block_hash] = entry
+        self.children.setdefault(block.previousHash, []).append(block_hash)
+
+        if not entry.invalid and (self.tip is None or entry.work > self.tip.work):
+            if not self.__set_tip(entry):
+                self.__find_tip()
+        return entry
+
+    # Marca un bloque y todos sus descendientes como invalidos
+    def __mark_invalid(self, entry):
+        pending = [entry]
+        while pending:
+            entry = pending.pop()
+            entry.invalid = True
+            pending.extend(self.children_of(entry.hash))
+
+    # Busca la punta entre los bloques validos mas pesados que la punta actual, se usa cuando
+    # fallo un cambio de rama (la rama que se intento quedo marcada como invalida)
+    def __find_tip(self):
+        candidates = [e for e in self.entries.values() if not e.invalid and e.work > self.tip.work]
+        candidates.sort(key=lambda e: e.work, reverse=True)
+        for entry in candidates:
+            # un intento fallido anterior puede haber invalidado a este candidato
+            if not entry.invalid and self.__set_tip(entry):
+                return
+
+    # Bloque comun mas reciente entre dos bloques del arbol
+    def fork_point(self, a, b):
+        while a is not None and b is not None and a is not b:
+            if a.height >= b.height:
+                a = a.parent
+            else:
+                b = b.parent
+        if a is b:
+            return a
+        return None
+
+    # Cambia la punta de la mejor rama. Se desconectan los bloques de la rama vieja
+    # hasta el punto de bifurcacion y se conectan los de la rama nueva
+    def __set_tip(self, new_tip):
+        old_tip = self.tip
+        fork = self.fork_point(old_tip, new_tip) if old_tip is not None else None
+
+        disconnected = []
+        entry = old_tip
+        while entry is not None and entry is not fork:
+            disconnected.append(entry)
+            entry = entry.parent
+
+        connected = []
+        entry = new_tip
+        while entry is not None and entry is not fork:
+            connected.append(entry)
+            entry = entry.parent
+        connected.reverse()
+
+        if self.ledger is not None and not self.__update_ledger(disconnected, connected):
+            return False
+
+        self.tip = new_tip
+        self.last_reorg = (disconnected, connected)
+        return True
+
+    # Aplica el cambio de rama al ledger. Si un bloque de la rama nueva no se puede aplicar,
+    # se marca como invalido (con sus descendientes) y se vuelve a la rama vieja
+    def __update_ledger(self, disconnected, connected):
+        for entry in disconnected:
+            self.ledger.disconnect_block(entry.block)
+        applied = []
+        for entry in connected:
+            if not self.ledger.apply_block(entry.block):
+                self.__mark_invalid(entry)
+                for done in reversed(applied):
+                    self.ledger.disconnect_block(done.block)
+                for old in reversed(disconnected):
+                    self.ledger.apply_block(old.block)
+                return False
+            applied.append(entry)
+        return True
+
+    # Bloques de la mejor rama, desde el root hasta la punta
+    def best_chain(self):
+        chain = []
+        entry = self.tip
+        while entry is not None:
+            chain.append(entry)
+            entry = entry.parent
+        chain.reverse()
+        return chain
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    from BlockChain import CBlock
+
+    # Igual que en BlockChain.py, B1 y B2 son hijos de root
+    root = CBlock(b'I am root', None)
+    B1 = CBlock('Im a child!', root)
+    B2 = CBlock('Im a brother', root)
+    B3 = CBlock(b'I contiain bytes', B1)
+
+    tree = BlockTree()
+    for b in [root, B1, B2, B3]:
+        tree.add(b)
+
+    siblings = [e.block.data for e in tree.children_of(root.computeHash())]
+    print("Children of root: " + str(siblings))
+
+    if tree.tip.block is B3 and tree.tip.height == 2:
+        print("Success! Best tip is B3")
+    else:
+        print("ERROR! Wrong best tip")
+
+    # La rama de B2 crece hasta ser mas pesada, se produce un reorg
+    B4 = CBlock(12354, B2)
+    B5 = CBlock("child of B4", B4)
+    tree.add(B4)
+    tree.add(B5)
+    disconnected, connected = tree.last_reorg
+    if tree.tip.block is B5 and [e.block for e in disconnected] == [B3, B1] \
+            and [e.block for e in connected] == [B2, B4, B5]:
+        print("Success! Reorg to the heavier fork")
+    else:
+        print("ERROR! Reorg failed")
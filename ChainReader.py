@@ -0,0 +1,177 @@
+#ChainReader.py
+
+"""
+    El siguiente codigo lee y valida una cadena guardada en un BlockStore bloque a bloque.
+    * Un TxBlock cargado con pickle trae en memoria a todos sus antecesores (via previousBlock), la
+    memoria crece con el largo de la cadena.
+    * ChainReader usa generadores: los bloques se cargan de a uno, del mas viejo al mas nuevo o al
+    reves, y solo se mantienen en memoria los ultimos `window` bloques.
+    * Para validar, cada bloque se enlaza (previousBlock) con los bloques anteriores de la ventana,
+    lo necesario para comprobar su enlace, su objetivo de dificultad y su timestamp, y al salir de
+    la ventana se corta el enlace para que el recolector de basura lo libere.
+    * La validacion es un pipeline: leer el bloque, comprobar su hash guardado, su enlace con el
+    anterior y sus transacciones (TxBlock.is_valid), y seguir con el proximo.
+"""
+from collections import deque
+
+import Difficulty
+
+# Cantidad de bloques que se mantienen enlazados en memoria al validar
+WINDOW = 32
+# Ventana minima: Difficulty.next_target recorre RETARGET_INTERVAL bloques hacia atras desde
+# el bloque anterior y Difficulty.median_time_past toma MEDIAN_SPAN bloques
+MIN_WINDOW = max(Difficulty.RETARGET_INTERVAL, Difficulty.MEDIAN_SPAN) + 2
+
+
+class ChainReader:
+
+    def __init__(self, store, window=WINDOW):
+        self.store = store
+        self.window = max(window, MIN_WINDOW)
+        # cantidad de bloques verificados en la ultima validacion
+        self.validated = 0
+        # altura del primer bloque invalido encontrado en la ultima validacion
+        self.invalid_height = None
+
+    # Bloques de start a stop (sin incluir), del mas viejo al mas nuevo, sin enlazar
+    def blocks(self, start=0, stop=None):
+        if stop is None:
+            stop = len(self.store)
+        for height in range(start, stop):
+            yield self.store.get(height)
+
+    # Bloques desde start (por defecto el ultimo) hasta stop (incluido), del mas nuevo al mas viejo
+    def reverse(self, start=None, stop=0):
+        if start is None:
+            start = len(self.store) - 1
+        for height in range(start, stop - 1, -1):
+            yield self.store.get(height)
+
+    # Bloques del mas viejo al mas nuevo, cada uno enlazado con los bloques anteriores que
+    # siguen en la ventana. El bloque mas viejo de la ventana queda sin bloque anterior.
+    # Con context > 0 se cargan tambien (sin retornarlos) los bloques anteriores a start
+    def linked(self, start=0, stop=None, context=0):
+        first = max(0, start - context)
+        recent = deque()
+        for height, block in enumerate(self.blocks(first, stop), first):
+            if recent:
+                object.__setattr__(block, 'previousBlock', recent[-1])
+            recent.append(block)
+            if len(recent) > self.window:
+                recent.popleft()
+                object.__setattr__(recent[0], 'previousBlock', None)
+            if height >= start:
+                yield block
+
+    # Valida la cadena guardada (o el tramo [start, stop)) manteniendo en memoria solo la ventana.
+    # Con workers > 1 las transacciones de cada bloque se verifican en paralelo
+    def validate(self, start=0, stop=None, workers=None):
+        self.validated = 0
+        self.invalid_height = None
+        if start > 0:
+            # el primer bloque del tramo debe enlazar con el hash guardado del anterior
+            expected = self.store.block_hash(start - 1)
+        else:
+            expected = None
+
+        # los bloques anteriores al tramo se cargan para calcular el objetivo de dificultad
+        height = start
+        for block in self.linked(start, stop, context=MIN_WINDOW - 1):
+            self.validated = self.validated + 1
+            block_hash = block.computeHash()
+            if block_hash != self.store.block_hash(height) or block.previousHash != expected \
+                    or not self.__block_valid(block, workers):
+                self.invalid_height = height
+                return False
+            expected = block_hash
+            height = height + 1
+        return True
+
+    def __block_valid(self, block, workers):
+        if workers is not None:
+            return block.is_valid(workers=workers)
+        return block.is_valid()
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import os
+    import tracemalloc
+
+    from BlockStore import BlockStore
+    from Signatures import generate_keys
+    from Transactions import Tx
+    from TxBlock import TxBlock
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    def make_block(previousBlock, amount=1):
+        block = TxBlock(previousBlock)
+        for i in range(5):
+            tx = Tx()
+            tx.add_input(pu1, amount)
+            tx.add_output(pu2, amount)
+            tx.sign(pr1)
+            block.addTx(tx)
+        return block
+
+    # Guardamos dos cadenas, una 4 veces mas larga que la otra
+    def make_store(path, length):
+        if os.path.exists(path):
+            os.remove(path)
+        store = BlockStore(path)
+        block = None
+        recent = deque(maxlen=MIN_WINDOW)
+        for i in range(length):
+            block = make_block(block)
+            store.append(block)
+            # cortamos los enlaces viejos para no tener toda la cadena en memoria
+            recent.append(block)
+            if len(recent) == recent.maxlen:
+                object.__setattr__(recent[0], 'previousBlock', None)
+        return store
+
+    peaks = []
+    for path, length in (("short.dat", 100), ("long.dat", 400)):
+        store = make_store(path, length)
+        reader = ChainReader(store, window=16)
+        tracemalloc.start()
+        valid = reader.validate()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        if valid and reader.validated == length:
+            print("Success! " + str(length) + " blocks valid, peak memory: " + str(peak // 1024) + " KB")
+        else:
+            print("ERROR! Chain of " + str(length) + " blocks is invalid at " + str(reader.invalid_height))
+
+    if peaks[1] < peaks[0] * 2:
+        print("Success! Peak memory does not grow with the chain length")
+    else:
+        print("ERROR! Peak memory grows with the chain length")
+
+    # Recorrido del mas nuevo al mas viejo
+    heights = [block.height for block in reader.reverse(start=9)]
+    if heights == list(range(9, -1, -1)):
+        print("Success! Reverse iteration")
+    else:
+        print("ERROR! Reverse iteration: " + str(heights))
+
+    # Un bloque con una transaccion invalida al final de la cadena (el ultimo bloque
+    # se lee enlazado con la ventana para calcular el objetivo del bloque nuevo)
+    for tip in reader.linked(len(store) - MIN_WINDOW):
+        pass
+    bad = TxBlock(tip)
+    tx = Tx()
+    tx.add_input(pu1, 1)
+    tx.add_output(pu2, 100)
+    tx.sign(pr1)
+    bad.addTx(tx)
+    store.append(bad)
+    if not reader.validate(start=350) and reader.invalid_height == len(store) - 1:
+        print("Success! Bad block detected at height " + str(reader.invalid_height))
+    else:
+        print("ERROR! Bad block not detected")
+    store.close()
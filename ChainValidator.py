@@ -0,0 +1,145 @@
+#ChainValidator.py
+
+"""
+    El siguiente codigo valida una cadena completa de bloques TxBlock.
+    * TxBlock.is_valid solo revisa las transacciones de un bloque y su enlace con el bloque anterior,
+    el validador recorre toda la cadena (de forma iterativa, no recursiva) validando cada bloque.
+    * Se guarda en disco un checkpoint con el hash del ultimo bloque completamente validado, asi,
+    despues de reiniciar o al llegar un bloque nuevo, solo se verifican los bloques posteriores
+    al checkpoint en lugar de repetir todas las verificaciones RSA de la cadena.
+"""
+import os
+
+
+class ChainValidator:
+
+    # Hash del ultimo bloque completamente validado
+    checkpoint = None
+    # Archivo donde se guarda el checkpoint (None para no guardarlo)
+    checkpoint_file = None
+
+    def __init__(self, checkpoint_file=None):
+        self.checkpoint_file = checkpoint_file
+        # cantidad de bloques verificados en la ultima validacion
+        self.validated = 0
+        # primer bloque invalido encontrado en la ultima validacion
+        self.invalid_block = None
+        self.load()
+
+    # Lee el checkpoint guardado en disco (el hash en hexadecimal)
+    def load(self):
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return
+        with open(self.checkpoint_file, "r") as f:
+            value = f.read().strip()
+        self.checkpoint = bytes.fromhex(value) if value else None
+
+    # Guarda el checkpoint, se escribe en un archivo temporal y se reemplaza
+    # para no dejar un checkpoint a medio escribir
+    def save(self):
+        if self.checkpoint_file is None:
+            return
+        tmp = self.checkpoint_file + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.checkpoint.hex() if self.checkpoint is not None else "")
+        os.replace(tmp, self.checkpoint_file)
+
+    # Olvida el checkpoint, la proxima validacion recorre toda la cadena
+    def reset(self):
+        self.checkpoint = None
+        self.save()
+
+    # Encargada de validar la cadena que termina en tip.
+    # Primero se recorre la cadena hacia atras hasta encontrar el checkpoint (o el bloque root),
+    # y luego se validan, del mas viejo al mas nuevo, solo los bloques posteriores al checkpoint.
+    # Si el checkpoint no pertenece a esta cadena se valida la cadena completa
+    def validate(self, tip):
+        self.validated = 0
+        self.invalid_block = None
+
+        pending = []
+        block = tip
+        while block is not None:
+            if self.checkpoint is not None and block.computeHash() == self.checkpoint:
+                break
+            pending.append(block)
+            block = block.previousBlock
+
+        last_good = None
+        valid = True
+        for block in reversed(pending):
+            self.validated = self.validated + 1
+            if not block.is_valid():
+                self.invalid_block = block
+                valid = False
+                break
+            last_good = block
+
+        # se avanza el checkpoint hasta el ultimo bloque valido
+        if last_good is not None:
+            self.checkpoint = last_good.computeHash()
+            self.save()
+        return valid
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    from Signatures import generate_keys
+    from Transactions import Tx
+    from TxBlock import TxBlock
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    # Creamos una cadena de bloques con una transaccion por bloque
+    tip = None
+    for i in range(10):
+        tx = Tx()
+        tx.add_input(pu1, 1)
+        tx.add_output(pu2, 1)
+        tx.sign(pr1)
+        tip = TxBlock(tip)
+        tip.addTx(tx)
+
+    validator = ChainValidator("checkpoint.dat")
+    validator.reset()
+
+    # La primera validacion recorre toda la cadena
+    if validator.validate(tip):
+        print("Success! Chain is valid, " + str(validator.validated) + " blocks verified")
+    else:
+        print("ERROR! Valid chain rejected")
+
+    # Agregamos un bloque nuevo, solo se verifica ese bloque
+    tx = Tx()
+    tx.add_input(pu2, 1)
+    tx.add_output(pu1, 1)
+    tx.sign(pr2)
+    tip = TxBlock(tip)
+    tip.addTx(tx)
+    validator.validate(tip)
+    if validator.validated == 1:
+        print("Success! Only the new block was verified")
+    else:
+        print("ERROR! " + str(validator.validated) + " blocks verified")
+
+    # Un validador nuevo (por ejemplo despues de reiniciar) parte del checkpoint guardado
+    restarted = ChainValidator("checkpoint.dat")
+    restarted.validate(tip)
+    if restarted.validated == 0:
+        print("Success! Checkpoint loaded after restart")
+    else:
+        print("ERROR! " + str(restarted.validated) + " blocks verified after restart")
+
+    # Un bloque nuevo con una transaccion mal firmada se detecta
+    bad = Tx()
+    bad.add_input(pu1, 5)
+    bad.add_output(pu2, 5)
+    bad.sign(pr2)
+    tip = TxBlock(tip)
+    tip.addTx(bad)
+    if not restarted.validate(tip):
+        print("Success! Bad block detected")
+    else:
+        print("ERROR! Bad block not detected")
@@ -0,0 +1,228 @@
+#Columnar.py
+
+"""
+    El siguiente codigo modela una representacion en columnas de las transacciones de uno o
+    varios bloques, para hacer la contabilidad de forma vectorizada.
+    * Sumar las cantidades recorriendo las tuplas (direccion, cantidad) de cada transaccion tiene
+    mucho costo por elemento en python, y al sumar floats hace falta una tolerancia para el error
+    de punto flotante.
+    * Las cantidades se guardan como enteros en unidades base (UNITS por moneda), asi las sumas son
+    exactas. Cada columna es un array('q') de enteros de 64 bits: las cantidades de las entradas y
+    las salidas, y a que transaccion (y bloque) pertenece cada fila.
+    * Si numpy esta instalado las operaciones (totales, cantidades negativas, comisiones por
+    transaccion y por bloque) se hacen sobre las mismas columnas sin copiarlas, si no con sum/min
+    de python sobre los arrays.
+    * Las columnas se arman una vez (por ejemplo al recorrer el historial) y se consultan todas las
+    veces que haga falta, de un bloque o de muchos bloques a la vez.
+"""
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Unidades base por moneda (como los satoshis de bitcoin)
+UNITS = 10 ** 8
+# Cantidad maxima (en valor absoluto) en unidades base, hasta 2**53 un double
+# representa los enteros de forma exacta
+MAX_UNITS = 2 ** 53
+
+
+# Cantidad en monedas -> entero en unidades base.
+# Lanza ValueError si la cantidad no es finita (NaN, infinito) o esta fuera de rango
+def to_units(amount):
+    if not math.isfinite(amount):
+        raise ValueError("Amount is not finite: " + repr(amount))
+    units = int(round(amount * UNITS))
+    if abs(units) > MAX_UNITS:
+        raise ValueError("Amount out of range: " + repr(amount))
+    return units
+
+# Entero en unidades base -> cantidad en monedas
+def from_units(units):
+    return units / UNITS
+
+
+class TxColumns:
+
+    def __init__(self):
+        # bloque al que pertenece cada transaccion
+        self.tx_block = array('q')
+        # transaccion y cantidad de cada entrada
+        self.in_tx = array('q')
+        self.in_amount = array('q')
+        # transaccion y cantidad de cada salida
+        self.out_tx = array('q')
+        self.out_amount = array('q')
+        self.blocks = 0
+
+    # Columnas de una lista de transacciones (un solo bloque)
+    @classmethod
+    def from_txs(cls, txs):
+        columns = cls()
+        columns.add_txs(txs)
+        return columns
+
+    # Columnas de las transacciones de varios bloques
+    @classmethod
+    def from_blocks(cls, blocks):
+        columns = cls()
+        for block in blocks:
+            columns.add_txs(block.data)
+        return columns
+
+    # Agrega las transacciones de un bloque
+    def add_txs(self, txs):
+        block = self.blocks
+        for tx in txs:
+            index = len(self.tx_block)
+            self.tx_block.append(block)
+            self.in_tx.extend([index] * len(tx.inputs))
+            self.in_amount.extend(to_units(amount) for addr, amount in tx.inputs)
+            self.out_tx.extend([index] * len(tx.outputs))
+            self.out_amount.extend(to_units(amount) for addr, amount in tx.outputs)
+        self.blocks = self.blocks + 1
+
+    def __len__(self):
+        return len(self.tx_block)
+
+    # Vista numpy (sin copia) de una columna
+    def __view(self, column):
+        return numpy.asarray(column, dtype=numpy.int64)
+
+    # Con numpy se suman por separado los 32 bits altos y los 32 bits bajos de cada cantidad,
+    # asi las sumas en int64 no desbordan aunque se sumen millones de filas, y el resultado
+    # se arma con enteros de python (exacto)
+    def __sum(self, column):
+        if numpy is not None:
+            values = self.__view(column)
+            return (int((values >> 32).sum()) << 32) + int((values & 0xFFFFFFFF).sum())
+        return sum(column)
+
+    # Suma de column agrupada segun groups (indices entre 0 y size - 1)
+    def __group_sum(self, groups, column, size):
+        if numpy is not None:
+            high = numpy.zeros(size, dtype=numpy.int64)
+            low = numpy.zeros(size, dtype=numpy.int64)
+            if len(column):
+                values = self.__view(column)
+                numpy.add.at(high, self.__view(groups), values >> 32)
+                numpy.add.at(low, self.__view(groups), values & 0xFFFFFFFF)
+            return [(h << 32) + l for h, l in zip(high.tolist(), low.tolist())]
+        result = [0] * size
+        for group, value in zip(groups, column):
+            result[group] = result[group] + value
+        return result
+
+    # Total de entradas y de salidas (en unidades base)
+    def totals(self):
+        return self.__sum(self.in_amount), self.__sum(self.out_amount)
+
+    # Comprueba si alguna entrada o salida tiene una cantidad negativa
+    def has_negative(self):
+        for column in (self.in_amount, self.out_amount):
+            if not len(column):
+                continue
+            if numpy is not None:
+                if (self.__view(column) < 0).any():
+                    return True
+            elif min(column) < 0:
+                return True
+        return False
+
+    # Comision de cada transaccion: entradas - salidas (en unidades base)
+    def tx_fees(self):
+        size = len(self.tx_block)
+        ins = self.__group_sum(self.in_tx, self.in_amount, size)
+        outs = self.__group_sum(self.out_tx, self.out_amount, size)
+        return [i - o for i, o in zip(ins, outs)]
+
+    # Total de entradas y de salidas de cada bloque: [(entradas, salidas), ...]
+    def block_totals(self):
+        if numpy is not None:
+            tx_block = self.__view(self.tx_block)
+            in_block = tx_block[self.__view(self.in_tx)]
+            out_block = tx_block[self.__view(self.out_tx)]
+        else:
+            in_block = array('q', (self.tx_block[i] for i in self.in_tx))
+            out_block = array('q', (self.tx_block[i] for i in self.out_tx))
+        ins = self.__group_sum(in_block, self.in_amount, self.blocks)
+        outs = self.__group_sum(out_block, self.out_amount, self.blocks)
+        return list(zip(ins, outs))
+
+    # Comisiones de cada bloque (sin contar la recompensa)
+    def block_fees(self):
+        return [i - o for i, o in self.block_totals()]
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import time
+    from Signatures import generate_keys
+    from Transactions import Tx
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    # 200 bloques de 100 transacciones (sin firmar, solo se mide la contabilidad)
+    class Block:
+        def __init__(self, data):
+            self.data = data
+
+    blocks = []
+    for b in range(200):
+        txs = []
+        for i in range(100):
+            tx = Tx()
+            tx.add_input(pu1, 1.1 + i / 100)
+            tx.add_output(pu2, 1 + i / 100)
+            txs.append(tx)
+        blocks.append(Block(txs))
+
+    # Totales recorriendo las tuplas de cada transaccion
+    start = time.perf_counter()
+    total_in = 0
+    total_out = 0
+    for block in blocks:
+        for tx in block.data:
+            for addr, amount in tx.inputs:
+                total_in = total_in + amount
+            for addr, amount in tx.outputs:
+                total_out = total_out + amount
+    loop_time = time.perf_counter() - start
+
+    columns = TxColumns.from_blocks(blocks)
+    start = time.perf_counter()
+    units_in, units_out = columns.totals()
+    column_time = time.perf_counter() - start
+
+    print("backend: " + ("numpy" if numpy is not None else "array"))
+    print("tuple loop: " + str(round(loop_time * 1000, 3)) + " ms, columns: " + str(round(column_time * 1000, 3)) + " ms")
+    print("float fee total: " + repr(total_in - total_out) + ", integer fee total: " + str(units_in - units_out) + " units")
+
+    if units_in - units_out == to_units(0.1) * 20000:
+        print("Success! Exact totals")
+    else:
+        print("ERROR! Wrong totals")
+
+    fees = columns.block_fees()
+    if len(fees) == 200 and all(fee == to_units(0.1) * 100 for fee in fees):
+        print("Success! Block fees")
+    else:
+        print("ERROR! Wrong block fees")
+
+    if columns.tx_fees()[:3] == [to_units(0.1)] * 3 and not columns.has_negative():
+        print("Success! Tx fees")
+    else:
+        print("ERROR! Wrong tx fees")
+
+    bad = Tx()
+    bad.add_input(pu1, 1)
+    bad.add_output(pu2, -1)
+    if TxColumns.from_txs([bad]).has_negative():
+        print("Success! Negative amount detected")
+    else:
+        print("ERROR! Negative amount not detected")
@@ -0,0 +1,151 @@
+#Difficulty.py
+
+"""
+    El siguiente codigo modela la dificultad del minado como un objetivo (target) de 256 bits.
+    * Un hash es valido si, leido como entero big-endian, es menor o igual al objetivo: una sola
+    comparacion de enteros por intento.
+    * El objetivo inicial tiene la misma probabilidad de exito por intento que la dificultad
+    anterior (dos bytes fijos y el tercero menor a 20), asi que minar un bloque cuesta en promedio
+    lo mismo que antes.
+    * Cada RETARGET_INTERVAL bloques se ajusta el objetivo segun el tiempo que tardaron los ultimos
+    bloques (sus timestamps) comparado con BLOCK_TIME: si se minaron mas rapido el objetivo baja
+    (mas dificil), si tardaron mas sube. El ajuste se limita a un factor MAX_ADJUST por vez.
+    * El trabajo de un bloque (para elegir la rama mas pesada) es la cantidad esperada de hashes
+    para encontrarlo: 2**256 / (objetivo + 1).
+    * Como el ajuste depende de los timestamps, estos se validan: cada timestamp debe ser mayor que
+    la mediana de los ultimos MEDIAN_SPAN bloques y no estar mas de MAX_FUTURE_TIME en el futuro,
+    asi no se puede atrasar ni adelantar un bloque para abaratar el objetivo.
+    * Las funciones reciben el bloque anterior y, opcionalmente, una funcion previous(bloque) que
+    retorna su bloque anterior (por defecto previousBlock), asi sirven tanto para los bloques
+    enlazados como para una cadena de cabeceras indexada por altura.
+"""
+import time
+
+# Objetivo maximo (la dificultad minima)
+MAX_TARGET = 2 ** 256 - 1
+# Objetivo inicial: hash < 20 * 2**232
+INITIAL_TARGET = 20 * 2 ** 232 - 1
+# Cada cuantos bloques se ajusta el objetivo
+RETARGET_INTERVAL = 10
+# Tiempo deseado entre bloques (en segundos)
+BLOCK_TIME = 10.0
+# Factor maximo de ajuste del objetivo en cada ajuste
+MAX_ADJUST = 4
+# Cantidad de bloques de los que se toma la mediana de los timestamps
+MEDIAN_SPAN = 11
+# Cuanto puede estar un timestamp en el futuro (en segundos). Es chico comparado con el tramo
+# de un ajuste (RETARGET_INTERVAL * BLOCK_TIME) para que adelantar un bloque casi no cambie el objetivo
+MAX_FUTURE_TIME = 2 * BLOCK_TIME
+
+
+# Comprueba si un hash cumple con el objetivo
+def check_hash(this_hash, target=INITIAL_TARGET):
+    return int.from_bytes(this_hash, 'big') <= target
+
+# Trabajo esperado para encontrar un hash que cumpla con el objetivo
+def work(target):
+    return 2 ** 256 // (target + 1)
+
+# Nuevo objetivo a partir del objetivo actual y de los timestamps del primer y el ultimo
+# bloque de un tramo de `blocks` intervalos
+def retarget(target, first_time, last_time, blocks, block_time=BLOCK_TIME):
+    expected = block_time * blocks
+    actual = last_time - first_time
+    # se limita el ajuste (tambien protege de timestamps desordenados o en cero)
+    actual = max(expected / MAX_ADJUST, min(actual, expected * MAX_ADJUST))
+    new_target = target * int(actual * 1000) // int(expected * 1000)
+    return max(1, min(new_target, MAX_TARGET))
+
+# Bloque anterior de un bloque enlazado
+def previous_block(block):
+    return block.previousBlock
+
+# Hasta count bloques desde block (incluido) hacia atras, del mas nuevo al mas viejo
+def ancestors(block, count, previous=previous_block):
+    while block is not None and count > 0:
+        yield block
+        block = previous(block)
+        count = count - 1
+
+# Objetivo que le corresponde al bloque que sigue a previousBlock. Solo cambia en las alturas
+# multiplo de RETARGET_INTERVAL, y para calcularlo se recorren los bloques anteriores
+# hasta RETARGET_INTERVAL bloques atras
+def next_target(previousBlock, interval=RETARGET_INTERVAL, block_time=BLOCK_TIME, previous=previous_block):
+    if previousBlock is None:
+        return INITIAL_TARGET
+    if (previousBlock.height + 1) % interval != 0:
+        return previousBlock.target
+    for first in ancestors(previousBlock, interval + 1, previous):
+        pass
+    blocks = previousBlock.height - first.height
+    if blocks == 0:
+        return previousBlock.target
+    return retarget(previousBlock.target, first.timestamp, previousBlock.timestamp, blocks, block_time)
+
+# Mediana de los timestamps de previousBlock y sus MEDIAN_SPAN - 1 bloques anteriores
+def median_time_past(previousBlock, span=MEDIAN_SPAN, previous=previous_block):
+    times = sorted(block.timestamp for block in ancestors(previousBlock, span, previous))
+    return times[len(times) // 2]
+
+# Comprueba el timestamp del bloque que sigue a previousBlock: debe ser mayor que la mediana de
+# los bloques anteriores y no estar mas de MAX_FUTURE_TIME despues de now (por defecto la hora actual)
+def valid_timestamp(timestamp, previousBlock, now=None, previous=previous_block):
+    if previousBlock is not None and not timestamp > median_time_past(previousBlock, previous=previous):
+        return False
+    if now is None:
+        now = time.time()
+    return timestamp <= now + MAX_FUTURE_TIME
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+
+    # Bloques simulados con timestamps, sin minar
+    class Block:
+        def __init__(self, previousBlock, timestamp):
+            self.previousBlock = previousBlock
+            self.height = previousBlock.height + 1 if previousBlock is not None else 0
+            self.timestamp = timestamp
+            self.target = next_target(previousBlock)
+
+    # Simulamos que la potencia de minado se duplica cada 30 bloques: sin ajuste los bloques
+    # saldrian cada vez mas rapido, con el ajuste el intervalo vuelve a BLOCK_TIME
+    rate = 1.0
+    block = Block(None, 0.0)
+    intervals = []
+    for height in range(1, 120):
+        if height % 30 == 0:
+            rate = rate * 2
+        # tiempo esperado para encontrar el bloque con la potencia y el objetivo actuales
+        spacing = BLOCK_TIME * INITIAL_TARGET / (block.target * rate)
+        block = Block(block, block.timestamp + spacing)
+        intervals.append(spacing)
+
+    print("interval right after hash power doubles: " + str(round(intervals[30], 2)) + " s")
+    print("interval at the end: " + str(round(intervals[-1], 2)) + " s")
+    if abs(intervals[-1] - BLOCK_TIME) < 1.0:
+        print("Success! Block interval is back to " + str(BLOCK_TIME) + " s")
+    else:
+        print("ERROR! Block interval did not converge")
+
+    # Timestamps atrasados (no mayores que la mediana) o muy adelantados se rechazan
+    now = block.timestamp + BLOCK_TIME
+    if valid_timestamp(now, block, now) and not valid_timestamp(median_time_past(block), block, now) \
+            and not valid_timestamp(now + MAX_FUTURE_TIME + 1, block, now):
+        print("Success! Bad timestamps rejected")
+    else:
+        print("ERROR! Bad timestamps accepted")
+
+    # El ajuste se limita a MAX_ADJUST aunque los bloques salgan de inmediato
+    if retarget(INITIAL_TARGET, 0.0, 0.0, 10) == INITIAL_TARGET // MAX_ADJUST:
+        print("Success! Adjustment is clamped")
+    else:
+        print("ERROR! Adjustment is not clamped")
+
+    # Misma probabilidad por intento que antes: 20 / 2**24
+    if (INITIAL_TARGET + 1) * 2 ** 24 == 20 * 2 ** 256 and check_hash(bytes(2) + bytes([19]) + bytes(29)) \
+            and not check_hash(bytes(2) + bytes([20]) + bytes(29)):
+        print("Success! Initial target matches the old difficulty")
+    else:
+        print("ERROR! Initial target does not match the old difficulty")
@@ -0,0 +1,95 @@
+#Encoding.py
+
+"""
+    El siguiente codigo define la codificacion binaria canonica de transacciones y bloques.
+    * Todo lo que se hashea o se firma pasa por aqui, en lugar de usar bytes(str(...)) de listas
+    de Python, que depende del repr de cada objeto y es cuadratico en el caso de Tx.__repr__
+    * Cada campo de longitud variable (direcciones, firmas, hashes) va precedido por su longitud
+    en 4 bytes big-endian, y los montos se codifican en 8 bytes (double IEEE 754 big-endian)
+    * El primer byte de cada codificacion es la version, para poder cambiar el formato sin
+    confundir datos viejos con nuevos
+"""
+import struct
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+
+# Version actual de la codificacion
+ENCODING_VERSION = 1
+# Version de la cabecera de un TxBlock (2: incluye timestamp y objetivo de dificultad)
+HEADER_VERSION = 2
+# Tamaño de un hash SHA-256
+HASH_SIZE = 32
+
+_u32 = struct.Struct('>I')
+_amount = struct.Struct('>d')
+_timestamp = struct.Struct('>d')
+
+
+# Convierte una direccion (o cualquier campo) a bytes
+def as_bytes(value):
+    if value is None:
+        return b''
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return bytes(value, 'utf-8')
+    return bytes(str(value), 'utf-8')
+
+# Campo de longitud variable: 4 bytes de longitud + contenido
+def field(value):
+    value = as_bytes(value)
+    return _u32.pack(len(value)) + value
+
+# Monto de ancho fijo (8 bytes)
+def amount(value):
+    return _amount.pack(float(value))
+
+# Codifica una lista de tuplas (direccion, monto)
+def _encode_entries(parts, entries):
+    parts.append(_u32.pack(len(entries)))
+    for addr, amt in entries:
+        parts.append(field(addr))
+        parts.append(amount(amt))
+
+# Mensaje que se firma en una transaccion: version + entradas + salidas + custodios
+def encode_tx_message(inputs, outputs, reqd):
+    parts = [bytes([ENCODING_VERSION])]
+    _encode_entries(parts, inputs)
+    _encode_entries(parts, outputs)
+    parts.append(_u32.pack(len(reqd)))
+    for addr in reqd:
+        parts.append(field(addr))
+    return b''.join(parts)
+
+# Transaccion completa: mensaje firmado + lista de (huella de quien firma, firma)
+def encode_tx(message, sigs, signers):
+    parts = [message, _u32.pack(len(sigs))]
+    for signer, sig in zip(signers, sigs):
+        parts.append(field(signer))
+        parts.append(field(sig))
+    return b''.join(parts)
+
+# Bloque: version + datos + hash del bloque anterior
+def encode_block(data, previousHash):
+    return bytes([ENCODING_VERSION]) + field(data) + field(previousHash)
+
+# Cabecera de un TxBlock (sin el nonce), de tamaño fijo:
+# version + hash del bloque anterior (ceros para el bloque root) + raiz de Merkle
+# + timestamp (8 bytes) + objetivo de dificultad (32 bytes, ver Difficulty.py)
+def encode_header(previousHash, merkle_root, timestamp, target):
+    if previousHash is None:
+        previousHash = bytes(HASH_SIZE)
+    return (bytes([HEADER_VERSION]) + previousHash + merkle_root
+            + _timestamp.pack(timestamp) + target.to_bytes(HASH_SIZE, 'big'))
+
+# Nonce de un bloque, va despues de la cabecera
+def encode_nonce(nonce):
+    return bytes(str(nonce), 'utf-8')
+
+# Hash SHA-256 de la concatenacion de las partes
+def sha256(*parts):
+    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
+    for part in parts:
+        digest.update(part)
+    return digest.finalize()
@@ -0,0 +1,153 @@
+#Headers.py
+
+"""
+    El siguiente codigo modela las cabeceras de los bloques y una cadena de solo cabeceras.
+    * CBlock y TxBlock guardan sus campos en un __dict__ y cada bloque mantiene en memoria todo su
+    cuerpo (y el de sus antecesores, via previousBlock).
+    * BlockHeader usa __slots__ y solo guarda el hash anterior, la raiz de Merkle (el compromiso
+    con el cuerpo), el nonce, la altura, el timestamp y el objetivo de dificultad. Su hash es el
+    mismo que el del TxBlock correspondiente.
+    * HeaderChain enlaza y valida millones de cabeceras sin cargar las transacciones, pensado
+    para los nodos que solo monitorean la cadena. Cada cabecera debe cumplir su objetivo de
+    dificultad (prueba de trabajo), para pruebas se puede crear la cadena con un objetivo inicial
+    facil (Difficulty.MAX_TARGET).
+"""
+import Encoding
+import Difficulty
+
+
+class BlockHeader:
+
+    __slots__ = ('previousHash', 'merkle_root', 'nonce', 'height', 'timestamp', 'target')
+
+    def __init__(self, previousHash, merkle_root, nonce, height, timestamp=0.0,
+                 target=Difficulty.INITIAL_TARGET):
+        self.previousHash = previousHash
+        self.merkle_root = merkle_root
+        self.nonce = nonce
+        self.height = height
+        self.timestamp = timestamp
+        self.target = target
+
+    # Igual a TxBlock.computeHash del bloque con esta cabecera
+    def hash(self):
+        return Encoding.sha256(Encoding.encode_header(self.previousHash, self.merkle_root,
+                                                      self.timestamp, self.target),
+                               Encoding.encode_nonce(self.nonce))
+
+    def __repr__(self):
+        return "BlockHeader(height=" + str(self.height) + ", hash=" + self.hash().hex() + ")"
+
+
+# Cadena de solo cabeceras
+class HeaderChain:
+
+    def __init__(self, initial_target=Difficulty.INITIAL_TARGET):
+        self.headers = []
+        # objetivo de la primera cabecera, desde ahi se ajusta segun Difficulty.next_target
+        self.initial_target = initial_target
+        # hash de la ultima cabecera, se calcula una sola vez al agregarla
+        self.tip_hash = None
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __getitem__(self, height):
+        return self.headers[height]
+
+    # Ultima cabecera (None si la cadena esta vacia)
+    def last(self):
+        return self.headers[-1] if self.headers else None
+
+    # Cabecera anterior a una cabecera de la cadena (para las funciones de Difficulty)
+    def previous(self, header):
+        if header.height == 0:
+            return None
+        return self.headers[header.height - 1]
+
+    # Objetivo de dificultad que le corresponde a la proxima cabecera (ver Difficulty.next_target)
+    def next_target(self):
+        if not self.headers:
+            return self.initial_target
+        return Difficulty.next_target(self.last(), previous=self.previous)
+
+    # Agrega una cabecera, debe enlazar con la ultima (hash anterior y altura),
+    # tener el objetivo de dificultad que le corresponde, un timestamp valido y cumplir el objetivo
+    def add(self, header):
+        if header.previousHash != self.tip_hash or header.height != len(self.headers):
+            raise ValueError("Header does not extend the chain")
+        if header.target != self.next_target():
+            raise ValueError("Header has a wrong difficulty target")
+        if not Difficulty.valid_timestamp(header.timestamp, self.last(), previous=self.previous):
+            raise ValueError("Header has an invalid timestamp")
+        header_hash = header.hash()
+        if not Difficulty.check_hash(header_hash, header.target):
+            raise ValueError("Header does not meet its difficulty target")
+        self.headers.append(header)
+        self.tip_hash = header_hash
+
+    # Vuelve a validar los enlaces y la prueba de trabajo de toda la cadena
+    def is_valid(self):
+        previousHash = None
+        for height, header in enumerate(self.headers):
+            if header.previousHash != previousHash or header.height != height:
+                return False
+            previousHash = header.hash()
+            if not Difficulty.check_hash(previousHash, header.target):
+                return False
+        return previousHash == self.tip_hash
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import tracemalloc
+    import Merkle
+
+    # Cadena de prueba de 100.000 cabeceras (sin transacciones), una cada BLOCK_TIME segundos.
+    # Con el objetivo maximo cualquier nonce cumple la prueba de trabajo, asi no hay que minarlas
+    tracemalloc.start()
+    chain = HeaderChain(initial_target=Difficulty.MAX_TARGET)
+    for height in range(100000):
+        chain.add(BlockHeader(chain.tip_hash, Merkle.EMPTY_ROOT, height, height,
+                              height * Difficulty.BLOCK_TIME, chain.next_target()))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("100000 headers: " + str(current // 1024) + " KB")
+
+    if chain.is_valid():
+        print("Success! Header chain is valid")
+    else:
+        print("ERROR! Header chain is invalid")
+
+    # Una cabecera con un objetivo distinto del que le corresponde se rechaza
+    try:
+        chain.add(BlockHeader(chain.tip_hash, Merkle.EMPTY_ROOT, 0, len(chain),
+                              len(chain) * Difficulty.BLOCK_TIME, Difficulty.INITIAL_TARGET))
+        print("ERROR! Wrong target accepted")
+    except ValueError:
+        print("Success! Wrong target rejected")
+
+    # Con el objetivo inicial real una cabecera sin minar no cumple la prueba de trabajo
+    # (el nonce 0 cumple con probabilidad 20 / 2**24)
+    real = HeaderChain()
+    try:
+        real.add(BlockHeader(None, Merkle.EMPTY_ROOT, 0, 0, 0.0, real.next_target()))
+        print("ERROR! Unmined header accepted")
+    except ValueError:
+        print("Success! Unmined header rejected")
+
+    # Una cabecera con un timestamp atrasado se rechaza
+    try:
+        chain.add(BlockHeader(chain.tip_hash, Merkle.EMPTY_ROOT, 0, len(chain),
+                              0.0, chain.next_target()))
+        print("ERROR! Backdated header accepted")
+    except ValueError:
+        print("Success! Backdated header rejected")
+
+    # Una cabecera modificada rompe los enlaces
+    chain[500].nonce = 12345
+    if not chain.is_valid():
+        print("Success! Tampered header detected")
+    else:
+        print("ERROR! Tampered header not detected")
@@ -0,0 +1,150 @@
+#KeyRegistry.py
+
+"""
+    El siguiente codigo modela un registro de claves publicas para usar direcciones cortas.
+    * Cada entrada, salida y custodio de una transaccion guardaba la clave publica completa (unos 450
+    bytes en PEM para RSA), repetida en miles de transacciones, en cada hash y en cada pickle.
+    * Ahora las transacciones guardan la huella de la clave (el SHA-256 de la direccion, 32 bytes) y
+    la clave completa se guarda una sola vez en el registro. Solo se busca la clave completa al
+    verificar una firma.
+    * Las huellas se internan: todas las transacciones que usan una misma direccion comparten el
+    mismo objeto en memoria.
+    * Al serializar una transaccion (pickle, por ejemplo en un BlockStore o al mandarla a otro
+    proceso) se guardan tambien las claves completas de quienes la firmaron, y al cargarla se
+    registran, asi sus firmas se pueden verificar en cualquier proceso.
+    * El registro completo tambien se puede guardar y cargar de disco (save/load).
+"""
+import os
+import struct
+import threading
+
+import Encoding
+
+# Tamaño de una huella (SHA-256)
+FINGERPRINT_SIZE = 32
+
+_u32 = struct.Struct('>I')
+
+
+# Una direccion de 32 bytes ya es una huella (las direcciones completas son mas largas:
+# PEM para RSA, 33 o 34 bytes para Ed25519 y ECDSA)
+def is_fingerprint(address):
+    return len(address) == FINGERPRINT_SIZE
+
+# Huella de una direccion (si ya es una huella se retorna tal cual)
+def fingerprint(address):
+    if is_fingerprint(address):
+        return address
+    return Encoding.sha256(address)
+
+
+class KeyRegistry:
+
+    def __init__(self):
+        # clave completa de cada huella
+        self.keys = {}
+        # huella (el objeto internado) de cada clave completa
+        self.fingerprints = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, fp):
+        return fp in self.keys
+
+    # Registra una direccion y retorna su huella internada
+    def intern(self, address):
+        fp = self.fingerprints.get(address)
+        if fp is not None:
+            return fp
+        if is_fingerprint(address):
+            key = self.keys.get(address)
+            return self.fingerprints[key] if key is not None else address
+        fp = Encoding.sha256(address)
+        with self.lock:
+            if fp in self.keys:
+                return self.fingerprints[self.keys[fp]]
+            self.keys[fp] = address
+            self.fingerprints[address] = fp
+        return fp
+
+    # Clave completa de una huella (None si no esta registrada).
+    # Las direcciones completas se retornan tal cual
+    def resolve(self, address):
+        if not is_fingerprint(address):
+            return address
+        return self.keys.get(address)
+
+    # Guarda las claves registradas, cada una con prefijo de longitud
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for address in list(self.keys.values()):
+                f.write(Encoding.field(address))
+        os.replace(tmp, path)
+
+    # Carga (y registra) las claves guardadas con save
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _u32.size <= len(data):
+            length = _u32.unpack_from(data, offset)[0]
+            offset = offset + _u32.size
+            self.intern(data[offset:offset + length])
+            offset = offset + length
+
+
+# Registro usado por las transacciones y las firmas
+registry = KeyRegistry()
+
+def intern(address):
+    return registry.intern(address)
+
+def resolve(address):
+    return registry.resolve(address)
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import pickle
+    # las transacciones usan el registro del modulo KeyRegistry (no el de __main__)
+    import KeyRegistry as shared
+    from Signatures import generate_keys
+    from Transactions import Tx
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    # 100 transacciones entre las mismas dos direcciones
+    txs = []
+    for i in range(100):
+        tx = Tx()
+        tx.add_input(pu1, 1)
+        tx.add_output(pu2, 1)
+        tx.sign(pr1)
+        txs.append(tx)
+
+    if all(tx.inputs[0][0] is txs[0].inputs[0][0] for tx in txs):
+        print("Success! Addresses are interned")
+    else:
+        print("ERROR! Addresses are not interned")
+
+    if all(tx.is_valid() for tx in txs):
+        print("Success! Transactions with fingerprint addresses are valid")
+    else:
+        print("ERROR! Valid transactions rejected")
+
+    print("pickled size of 100 transactions: " + str(len(pickle.dumps(txs))) + " bytes")
+    print("full key: " + str(len(pu1)) + " bytes, fingerprint: " + str(len(txs[0].inputs[0][0])) + " bytes")
+
+    # Guardamos y cargamos el registro en otro registro
+    shared.registry.save("keys.dat")
+    other = KeyRegistry()
+    other.load("keys.dat")
+    if other.resolve(fingerprint(pu1)) == pu1:
+        print("Success! Registry saved and loaded")
+    else:
+        print("ERROR! Registry load failed")
@@ -0,0 +1,148 @@
+#Ledger.py
+
+"""
+    El siguiente codigo modela el estado del libro contable: el saldo de cada direccion.
+    * Tx.is_valid solo revisa firmas y montos, y TxBlock.is_valid solo los totales de un bloque,
+    nada comprueba que una direccion de entrada realmente tenga las monedas que gasta.
+    * En lugar de recorrer toda la cadena por cada transaccion, el saldo de cada direccion se
+    actualiza de forma incremental al aplicar un bloque, y se guarda lo necesario para deshacerlo
+    si el bloque se desconecta (por ejemplo al cambiar a otra rama de la cadena).
+    * Consultar un saldo o comprobar si una entrada gasta de mas es O(1) por entrada.
+    * Las direcciones se guardan como su huella (ver KeyRegistry.py), los saldos se pueden
+    consultar con la huella o con la clave completa.
+    * Los saldos se llevan como enteros en unidades base (ver Columnar.py), asi las cuentas son
+    exactas y no hace falta tolerancia para el error de punto flotante.
+"""
+import Columnar
+import KeyRegistry
+
+
+class Ledger:
+
+    def __init__(self):
+        # saldo de cada direccion (en unidades base)
+        self.balances = {}
+        # pila de bloques aplicados: (hash del bloque, saldos previos de las direcciones que cambio)
+        self.undo = []
+
+    # Saldo actual de una direccion (en monedas)
+    def balance(self, addr):
+        return Columnar.from_units(self.balances.get(KeyRegistry.fingerprint(addr), 0))
+
+    # Hash del ultimo bloque aplicado
+    def tip_hash(self):
+        if not self.undo:
+            return None
+        return self.undo[-1][0]
+
+    # Comprueba si las entradas de una transaccion estan cubiertas por los saldos actuales
+    def can_spend(self, tx):
+        spent = {}
+        try:
+            for addr, amount in tx.inputs:
+                spent[addr] = spent.get(addr, 0) + Columnar.to_units(amount)
+                if self.balances.get(addr, 0) < spent[addr]:
+                    return False
+        except (ValueError, TypeError):
+            return False
+        return True
+
+    # Aplica las transacciones de un bloque, en orden: descuenta las entradas y acredita
+    # las salidas. Si alguna entrada gasta mas de lo que tiene su direccion no se aplica
+    # nada y retorna False (tambien si alguna cantidad no es finita o esta fuera de rango).
+    # El bloque debe enlazar con el ultimo bloque aplicado, igual que en BlockStore.append
+    def apply_block(self, block):
+        if block.previousHash != self.tip_hash():
+            raise ValueError("Block does not extend the ledger tip")
+        previous = {}
+        try:
+            for tx in block.data:
+                for addr, amount in tx.inputs:
+                    if addr not in previous:
+                        previous[addr] = self.balances.get(addr)
+                    new_balance = self.balances.get(addr, 0) - Columnar.to_units(amount)
+                    if new_balance < 0:
+                        self.__restore(previous)
+                        return False
+                    self.balances[addr] = new_balance
+                for addr, amount in tx.outputs:
+                    if addr not in previous:
+                        previous[addr] = self.balances.get(addr)
+                    self.balances[addr] = self.balances.get(addr, 0) + Columnar.to_units(amount)
+        except (ValueError, TypeError):
+            self.__restore(previous)
+            return False
+        self.undo.append((block.computeHash(), previous))
+        return True
+
+    # Deshace el ultimo bloque aplicado, que debe ser el bloque recibido
+    def disconnect_block(self, block):
+        if not self.undo or self.undo[-1][0] != block.computeHash():
+            raise ValueError("Only the last applied block can be disconnected")
+        block_hash, previous = self.undo.pop()
+        self.__restore(previous)
+
+    def __restore(self, previous):
+        for addr, value in previous.items():
+            if value is None:
+                self.balances.pop(addr, None)
+            else:
+                self.balances[addr] = value
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    from Signatures import generate_keys
+    from Transactions import Tx
+    from TxBlock import TxBlock
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    ledger = Ledger()
+
+    # El primer bloque solo contiene la recompensa del minero para pu1
+    B0 = TxBlock(None)
+    reward = Tx()
+    reward.add_output(pu1, 25)
+    B0.addTx(reward)
+    ledger.apply_block(B0)
+
+    # pu1 le envia 10 monedas a pu2
+    B1 = TxBlock(B0)
+    tx = Tx()
+    tx.add_input(pu1, 10)
+    tx.add_output(pu2, 10)
+    tx.sign(pr1)
+    B1.addTx(tx)
+    if ledger.apply_block(B1) and ledger.balance(pu1) == 15 and ledger.balance(pu2) == 10:
+        print("Success! Balances updated")
+    else:
+        print("ERROR! Wrong balances")
+
+    # pu2 intenta gastar mas de lo que tiene
+    B2 = TxBlock(B1)
+    tx = Tx()
+    tx.add_input(pu2, 11)
+    tx.add_output(pu1, 11)
+    tx.sign(pr2)
+    B2.addTx(tx)
+    if not ledger.can_spend(tx) and not ledger.apply_block(B2) and ledger.balance(pu2) == 10:
+        print("Success! Overspend detected")
+    else:
+        print("ERROR! Overspend not detected")
+
+    # Al desconectar B1 los saldos vuelven a los de B0
+    ledger.disconnect_block(B1)
+    if ledger.balance(pu1) == 25 and ledger.balance(pu2) == 0:
+        print("Success! Block rolled back")
+    else:
+        print("ERROR! Rollback failed")
+
+    # Un bloque que no enlaza con el ultimo bloque aplicado se rechaza
+    try:
+        ledger.apply_block(B0)
+        print("ERROR! Block out of order applied")
+    except ValueError:
+        print("Success! Block out of order rejected")
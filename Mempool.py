@@ -0,0 +1,184 @@
+#Mempool.py
+
+"""
+    El siguiente codigo modela el mempool: el conjunto de transacciones firmadas que esperan
+    ser incluidas en un bloque.
+    * Cada transaccion se valida una sola vez, al ser admitida, y se descartan las repetidas
+    usando su ID (Tx.txid).
+    * Las transacciones se ordenan en un heap por su comision (fee): lo que entra menos lo que sale,
+    esa diferencia es la que se lleva el minero. Las comisiones se calculan en unidades base
+    enteras (ver Columnar.py), con los mismos numeros que usa TxBlock.is_valid.
+    * Para armar un bloque se toman las transacciones de mayor comision hasta llenar el limite
+    de transacciones o de bytes, sin recorrer todo el mempool: O(k log n) para k transacciones.
+"""
+import heapq
+
+import Columnar
+from Transactions import Tx
+from TxBlock import TxBlock, REWARD
+
+
+# Comision de una transaccion en unidades base: total de entradas - total de salidas.
+# Lanza ValueError si alguna cantidad no es finita o esta fuera de rango
+def tx_fee(tx):
+    return Columnar.TxColumns.from_txs([tx]).tx_fees()[0]
+
+
+class Mempool:
+
+    def __init__(self):
+        # transacciones admitidas: txid -> (tx, comision en unidades base, tamaño en bytes)
+        self.entries = {}
+        # heap de (-comision, orden de llegada, txid), las entradas eliminadas se descartan
+        # al sacarlas del heap
+        self.heap = []
+        self.seq = 0
+        # cantidad de entradas del heap que ya no estan en el mempool
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, txid):
+        return txid in self.entries
+
+    def get(self, txid):
+        entry = self.entries.get(txid)
+        return entry[0] if entry is not None else None
+
+    # Admite una transaccion en el mempool, retorna False si ya estaba, si no es valida
+    # o si intenta crear monedas (comision negativa, o alguna cantidad no finita o fuera de rango).
+    # validated=True indica que las firmas ya se verificaron (por ejemplo en otro hilo)
+    def add(self, tx, validated=False):
+        txid = tx.txid()
+        if txid in self.entries:
+            return False
+        if not validated and not tx.is_valid():
+            return False
+        try:
+            fee = tx_fee(tx)
+        except (ValueError, TypeError):
+            return False
+        if fee < 0:
+            return False
+        self.entries[txid] = (tx, fee, len(tx.encode()))
+        heapq.heappush(self.heap, (-fee, self.seq, txid))
+        self.seq = self.seq + 1
+        return True
+
+    # Elimina una transaccion (por ejemplo porque ya se incluyo en un bloque)
+    def remove(self, txid):
+        if self.entries.pop(txid, None) is None:
+            return False
+        self.stale = self.stale + 1
+        # si el heap tiene mas entradas eliminadas que vivas, se reconstruye
+        if self.stale > len(self.entries):
+            self.heap = [item for item in self.heap if item[2] in self.entries]
+            heapq.heapify(self.heap)
+            self.stale = 0
+        return True
+
+    # Elimina del mempool las transacciones de un bloque ya aceptado
+    def remove_block(self, block):
+        for tx in block.data:
+            self.remove(tx.txid())
+
+    # Arma un bloque hijo de previousBlock con las transacciones de mayor comision,
+    # respetando los limites de cantidad de transacciones y de bytes.
+    # Si se indica reward_address se agrega la transaccion del minero con la
+    # recompensa mas las comisiones. Las transacciones siguen en el mempool hasta
+    # que se llame a remove_block
+    def assemble_block(self, previousBlock, max_txs=None, max_bytes=None, reward_address=None):
+        block = TxBlock(previousBlock)
+        taken = []
+        size = 0
+        fees = 0
+        while self.heap and (max_txs is None or len(taken) < max_txs):
+            item = heapq.heappop(self.heap)
+            entry = self.entries.get(item[2])
+            if entry is None:
+                self.stale = self.stale - 1
+                continue
+            tx, fee, tx_size = entry
+            if max_bytes is not None and size + tx_size > max_bytes:
+                heapq.heappush(self.heap, item)
+                break
+            taken.append(item)
+            block.addTx(tx)
+            size = size + tx_size
+            fees = fees + fee
+
+        # las transacciones tomadas vuelven al heap
+        for item in taken:
+            heapq.heappush(self.heap, item)
+
+        if reward_address is not None:
+            reward = Tx()
+            reward.add_output(reward_address, Columnar.from_units(Columnar.to_units(REWARD) + fees))
+            block.addTx(reward)
+        return block
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    from Signatures import generate_keys
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+    pr3, pu3 = generate_keys()
+
+    mempool = Mempool()
+
+    # Transacciones con distintas comisiones
+    for fee in [0.1, 0.5, 0.2, 0.4, 0.3]:
+        tx = Tx()
+        tx.add_input(pu1, 1 + fee)
+        tx.add_output(pu2, 1)
+        tx.sign(pr1)
+        if not mempool.add(tx):
+            print("ERROR! Valid Tx rejected")
+    print("Mempool size: " + str(len(mempool)))
+
+    # Una transaccion repetida no se admite
+    if not mempool.add(tx):
+        print("Success! Duplicate Tx rejected")
+    else:
+        print("ERROR! Duplicate Tx admitted")
+
+    # Una transaccion mal firmada no se admite
+    bad = Tx()
+    bad.add_input(pu1, 1)
+    bad.add_output(pu3, 1)
+    bad.sign(pr3)
+    if not mempool.add(bad):
+        print("Success! Invalid Tx rejected")
+    else:
+        print("ERROR! Invalid Tx admitted")
+
+    # El bloque se arma con las 3 transacciones de mayor comision
+    block = mempool.assemble_block(None, max_txs=3, reward_address=pu3)
+    fees = [Columnar.from_units(tx_fee(tx)) for tx in block.data[:-1]]
+    if fees == [0.5, 0.4, 0.3] and block.is_valid():
+        print("Success! Block assembled by fee: " + str(fees))
+    else:
+        print("ERROR! Wrong block template: " + str(fees))
+
+    # Una transaccion sin comision: en floats 0.3 - (0.1 + 0.2) es negativo, en unidades base es 0
+    exact = Tx()
+    exact.add_input(pu1, 0.3)
+    exact.add_output(pu2, 0.1)
+    exact.add_output(pu3, 0.2)
+    exact.sign(pr1)
+    if mempool.add(exact) and tx_fee(exact) == 0:
+        print("Success! Zero fee Tx admitted")
+    else:
+        print("ERROR! Zero fee Tx rejected")
+    mempool.remove(exact.txid())
+
+    # Al aceptar el bloque sus transacciones salen del mempool
+    mempool.remove_block(block)
+    if len(mempool) == 2:
+        print("Success! Mined transactions removed")
+    else:
+        print("ERROR! Mempool size is " + str(len(mempool)))
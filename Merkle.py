@@ -0,0 +1,139 @@
+#Merkle.py
+
+"""
+    El siguiente codigo modela un arbol de Merkle sobre las transacciones de un bloque.
+    * La raiz del arbol compromete a todas las transacciones, asi la cabecera del bloque solo
+    necesita la raiz (32 bytes) en lugar de todas las transacciones.
+    * La raiz se actualiza de forma incremental: solo se guardan las raices de los subarboles
+    completos (picos), agregar una hoja cuesta O(log n).
+    * Se pueden generar y verificar pruebas de inclusion de una sola transaccion, sin el bloque
+    completo. El arbol sigue la definicion de RFC 6962 (Certificate Transparency): las hojas y los
+    nodos se hashean con prefijos distintos (0x00 y 0x01) para que no se puedan confundir.
+"""
+import Encoding
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# Raiz de un arbol sin hojas
+EMPTY_ROOT = Encoding.sha256(b'')
+
+
+def leaf_hash(data):
+    return Encoding.sha256(LEAF_PREFIX, data)
+
+def node_hash(left, right):
+    return Encoding.sha256(NODE_PREFIX, left, right)
+
+
+# Raiz de Merkle que se actualiza de forma incremental
+class MerkleAccumulator:
+
+    def __init__(self):
+        # (cantidad de hojas, hash) de cada subarbol completo, de mayor a menor
+        self.peaks = []
+        self.size = 0
+
+    # Agrega el hash de una hoja, los subarboles del mismo tamaño se combinan
+    def append(self, leaf):
+        size = 1
+        node = leaf
+        while self.peaks and self.peaks[-1][0] == size:
+            peak_size, peak = self.peaks.pop()
+            node = node_hash(peak, node)
+            size = size * 2
+        self.peaks.append((size, node))
+        self.size = self.size + 1
+
+    # La raiz combina los picos de derecha a izquierda
+    def root(self):
+        if not self.peaks:
+            return EMPTY_ROOT
+        node = self.peaks[-1][1]
+        for size, peak in reversed(self.peaks[:-1]):
+            node = node_hash(peak, node)
+        return node
+
+
+# Raiz de Merkle de una lista de hashes de hojas
+def merkle_root(leaves):
+    acc = MerkleAccumulator()
+    for leaf in leaves:
+        acc.append(leaf)
+    return acc.root()
+
+# Mayor potencia de 2 menor que n (n > 1)
+def _split(n):
+    k = 1
+    while k * 2 < n:
+        k = k * 2
+    return k
+
+# Prueba de inclusion de la hoja en la posicion index: los hashes de los subarboles
+# hermanos en el camino desde la hoja hasta la raiz
+def inclusion_proof(leaves, index):
+    if index < 0 or index >= len(leaves):
+        raise IndexError("Leaf index out of range")
+    proof = []
+    lo, hi = 0, len(leaves)
+    # se recorre de la raiz hacia la hoja, y luego se invierte
+    while hi - lo > 1:
+        k = _split(hi - lo)
+        if index - lo < k:
+            proof.append(merkle_root(leaves[lo + k:hi]))
+            hi = lo + k
+        else:
+            proof.append(merkle_root(leaves[lo:lo + k]))
+            lo = lo + k
+    proof.reverse()
+    return proof
+
+# Verifica que la hoja en la posicion index pertenezca al arbol de size hojas con la raiz dada
+def verify_inclusion(leaf, index, size, proof, root):
+    if index < 0 or index >= size:
+        return False
+    fn = index
+    sn = size - 1
+    node = leaf
+    for sibling in proof:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            node = node_hash(sibling, node)
+            if not fn & 1:
+                while fn & 1 == 0 and fn != 0:
+                    fn = fn >> 1
+                    sn = sn >> 1
+        else:
+            node = node_hash(node, sibling)
+        fn = fn >> 1
+        sn = sn >> 1
+    return sn == 0 and node == root
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    leaves = [leaf_hash(bytes(str(i), 'utf-8')) for i in range(11)]
+
+    acc = MerkleAccumulator()
+    for leaf in leaves:
+        acc.append(leaf)
+    if acc.root() == merkle_root(leaves):
+        print("Success! Incremental root matches")
+
+    ok = True
+    for i in range(len(leaves)):
+        proof = inclusion_proof(leaves, i)
+        if not verify_inclusion(leaves[i], i, len(leaves), proof, acc.root()):
+            ok = False
+    if ok:
+        print("Success! All inclusion proofs verify")
+    else:
+        print("ERROR! Bad inclusion proof")
+
+    proof = inclusion_proof(leaves, 3)
+    if not verify_inclusion(leaf_hash(b'not a leaf'), 3, len(leaves), proof, acc.root()):
+        print("Success! Fake leaf rejected")
+    else:
+        print("ERROR! Fake leaf accepted")
@@ -0,0 +1,282 @@
+#Metrics.py
+
+"""
+    El siguiente codigo instrumenta las funciones mas costosas del proyecto para saber donde se va
+    el tiempo: Signatures.sign/verify, Encoding.sha256, CBlock.computeHash, TxBlock.good_nonce/find_nonce,
+    HashEngine.search y Tx.is_valid.
+    * Por cada funcion se cuenta la cantidad de llamadas y se guarda un histograma de latencias,
+    ademas se cuentan los bytes firmados, verificados y hasheados. El minado (HashEngine.search)
+    no pasa por Encoding.sha256: sus bytes son el prefijo una vez mas el nonce de cada intento.
+    * La instrumentacion se instala reemplazando las funciones al llamar a enable() y se quita con
+    disable(), asi desactivada no cuesta nada: se ejecutan las funciones originales.
+    * Las metricas se exportan en el formato de texto de Prometheus, a un archivo (FileSink) o
+    por un endpoint HTTP local (HttpSink). Cualquier objeto con un metodo export(registry) sirve de sink.
+"""
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import Encoding
+import Signatures
+from BlockChain import CBlock
+from Transactions import Tx
+from TxBlock import HashEngine, TxBlock
+
+# Limites de los buckets del histograma de latencias (en segundos)
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+# Prefijo de los nombres de las metricas
+PREFIX = "blockchain"
+
+
+# Histograma acumulativo de latencias
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count = self.count + 1
+        self.sum = self.sum + value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] = self.counts[i] + 1
+                break
+
+
+# Registro de las metricas de todas las operaciones
+class Registry:
+
+    def __init__(self):
+        self.calls = {}
+        self.latency = {}
+        self.bytes = {}
+        self.lock = threading.Lock()
+
+    def observe(self, op, elapsed, nbytes=None):
+        with self.lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            if op not in self.latency:
+                self.latency[op] = Histogram()
+            self.latency[op].observe(elapsed)
+            if nbytes is not None:
+                self.bytes[op] = self.bytes.get(op, 0) + nbytes
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+            self.latency.clear()
+            self.bytes.clear()
+
+    # Metricas en el formato de texto de Prometheus
+    def render(self):
+        lines = []
+        with self.lock:
+            lines.append("# HELP " + PREFIX + "_calls_total Number of calls per operation")
+            lines.append("# TYPE " + PREFIX + "_calls_total counter")
+            for op, count in sorted(self.calls.items()):
+                lines.append(PREFIX + '_calls_total{op="' + op + '"} ' + str(count))
+
+            lines.append("# HELP " + PREFIX + "_latency_seconds Latency per operation")
+            lines.append("# TYPE " + PREFIX + "_latency_seconds histogram")
+            for op, hist in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative = cumulative + count
+                    lines.append(PREFIX + '_latency_seconds_bucket{op="' + op + '",le="' + repr(bound) + '"} ' + str(cumulative))
+                lines.append(PREFIX + '_latency_seconds_bucket{op="' + op + '",le="+Inf"} ' + str(hist.count))
+                lines.append(PREFIX + '_latency_seconds_sum{op="' + op + '"} ' + repr(hist.sum))
+                lines.append(PREFIX + '_latency_seconds_count{op="' + op + '"} ' + str(hist.count))
+
+            lines.append("# HELP " + PREFIX + "_bytes_total Bytes signed, verified or hashed per operation")
+            lines.append("# TYPE " + PREFIX + "_bytes_total counter")
+            for op, nbytes in sorted(self.bytes.items()):
+                lines.append(PREFIX + '_bytes_total{op="' + op + '"} ' + str(nbytes))
+        return "\n".join(lines) + "\n"
+
+
+# Registro global
+registry = Registry()
+
+# Funciones originales reemplazadas por enable(): (objeto, atributo, funcion original)
+_installed = []
+
+
+# Reemplaza owner.attr por una version que mide cada llamada. Los bytes se calculan con
+# nbytes(*args, **kwargs) o, si dependen del resultado, con result_bytes(result, *args, **kwargs)
+def instrument(owner, attr, op, nbytes=None, result_bytes=None):
+    original = getattr(owner, attr)
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        size = None
+        try:
+            result = original(*args, **kwargs)
+            if result_bytes is not None:
+                size = result_bytes(result, *args, **kwargs)
+            return result
+        finally:
+            if nbytes is not None:
+                size = nbytes(*args, **kwargs)
+            registry.observe(op, time.perf_counter() - start, size)
+
+    setattr(owner, attr, wrapper)
+    _installed.append((owner, attr, original))
+
+
+def _message_size(message, *args):
+    return len(Signatures._message_bytes(message))
+
+def _hashed_size(*parts):
+    return sum(len(part) for part in parts)
+
+# Bytes de los nonces [start, start + count) codificados en decimal (ver Encoding.encode_nonce),
+# se cuentan por tramos de igual cantidad de digitos
+def _nonce_bytes(start, count):
+    total = 0
+    stop = start + count
+    digits = len(str(start))
+    while start < stop:
+        end = min(stop, 10 ** digits)
+        total = total + (end - start) * digits
+        start = end
+        digits = digits + 1
+    return total
+
+# Bytes hasheados por HashEngine.search: el prefijo una vez y el nonce de cada intento
+def _search_size(result, engine, start, count, stop_event=None):
+    nonce, attempts = result
+    return engine.prefix_size + _nonce_bytes(start, attempts)
+
+
+def enabled():
+    return len(_installed) > 0
+
+# Activa la instrumentacion de las funciones del proyecto
+def enable():
+    if enabled():
+        return
+    instrument(Signatures, 'sign', 'sign', _message_size)
+    instrument(Signatures, 'verify', 'verify', _message_size)
+    instrument(Encoding, 'sha256', 'sha256', _hashed_size)
+    instrument(CBlock, 'computeHash', 'computeHash')
+    instrument(TxBlock, 'good_nonce', 'good_nonce')
+    instrument(TxBlock, 'find_nonce', 'find_nonce')
+    instrument(HashEngine, 'search', 'hash_search', result_bytes=_search_size)
+    instrument(Tx, 'is_valid', 'tx_is_valid')
+
+# Quita la instrumentacion, se vuelven a usar las funciones originales
+def disable():
+    while _installed:
+        owner, attr, original = _installed.pop()
+        setattr(owner, attr, original)
+
+
+# Sink que escribe las metricas en un archivo de texto
+class FileSink:
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, registry):
+        with open(self.path, "w") as f:
+            f.write(registry.render())
+
+
+# Sink que sirve las metricas en http://host:port/metrics
+class HttpSink:
+
+    def __init__(self, host="127.0.0.1", port=9100):
+        self.host = host
+        self.port = port
+        self.server = None
+
+    # Inicia el servidor (en un hilo aparte) la primera vez que se exporta,
+    # cada pedido muestra las metricas en ese momento
+    def export(self, registry):
+        if self.server is not None:
+            return
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = bytes(registry.render(), 'utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Exporta el registro global a un sink
+def export(sink):
+    sink.export(registry)
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import urllib.request
+
+    enable()
+
+    pr1, pu1 = Signatures.generate_keys()
+    pr2, pu2 = Signatures.generate_keys()
+    block = TxBlock(None)
+    for i in range(5):
+        tx = Tx()
+        tx.add_input(pu1, 1)
+        tx.add_output(pu2, 1)
+        tx.sign(pr1)
+        block.addTx(tx)
+    block.is_valid()
+    found = block.find_nonce(attempts=1000)
+
+    if registry.calls.get('tx_is_valid') == 5 and registry.calls.get('sign') == 5:
+        print("Success! Calls counted")
+    else:
+        print("ERROR! Wrong call counts: " + str(registry.calls))
+
+    # find_nonce hashea el prefijo una vez y los nonces probados (0..999 si no encontro ninguno)
+    attempts = found + 1 if found is not None else 1000
+    if registry.bytes.get('hash_search') == len(block.mining_prefix()) + _nonce_bytes(0, attempts):
+        print("Success! Mining bytes counted")
+    else:
+        print("ERROR! Wrong mining bytes: " + str(registry.bytes.get('hash_search')))
+
+    sink = HttpSink(port=0)
+    export(sink)
+    text = urllib.request.urlopen("http://127.0.0.1:" + str(sink.port) + "/metrics").read().decode()
+    sink.close()
+    print(text)
+
+    # Desactivada, las funciones vuelven a ser las originales
+    disable()
+    calls = registry.calls.get('sign')
+    tx = Tx()
+    tx.add_input(pu1, 1)
+    tx.sign(pr1)
+    if registry.calls.get('sign') == calls:
+        print("Success! Instrumentation disabled")
+    else:
+        print("ERROR! Instrumentation still active")
@@ -0,0 +1,211 @@
+#Mining.py
+
+"""
+    El siguiente codigo modela un trabajo de minado que se puede pausar, reanudar y cancelar.
+    * find_nonce es todo o nada: prueba una cantidad fija de nonces, no se puede interrumpir y si
+    se agrega una transaccion al bloque hay que empezar de nuevo.
+    * MiningJob recorre los nonces en orden (un contador) y por tramos, asi su progreso es solo el
+    proximo nonce a probar: se puede guardar en un checkpoint y retomar desde ahi.
+    * Entre tramo y tramo revisa si la plantilla del bloque (su prefijo de minado: transacciones,
+    timestamp, objetivo...) cambio, y si cambio actualiza el motor de hashing y sigue desde el
+    mismo punto, sin descartar el trabajo ni el estado del minado.
+    * pause/resume/cancel se pueden llamar desde otro hilo, interrumpen el tramo actual.
+"""
+import json
+import os
+import threading
+
+from TxBlock import HashEngine
+
+# Cantidad de nonces que se prueban en cada tramo (entre tramos se revisa la plantilla)
+MINING_CHUNK = 10000
+
+
+class MiningJob:
+
+    def __init__(self, block, start=0, chunk=MINING_CHUNK):
+        self.block = block
+        self.chunk = chunk
+        # proximo nonce a probar y cantidad de intentos realizados
+        self.next_nonce = start
+        self.attempts = 0
+        # cantidad de veces que se actualizo la plantilla
+        self.refreshes = 0
+        self.found = None
+        self.cancelled = False
+        self.prefix = block.mining_prefix()
+        self.engine = HashEngine(self.prefix, block.target)
+        # _resume esta activo mientras no este en pausa, _stop interrumpe el tramo actual
+        self._resume = threading.Event()
+        self._resume.set()
+        self._stop = threading.Event()
+        self.lock = threading.Lock()
+
+    def pause(self):
+        self._resume.clear()
+        self._stop.set()
+
+    def resume(self):
+        self._resume.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._stop.set()
+        self._resume.set()
+
+    def paused(self):
+        return not self._resume.is_set()
+
+    def done(self):
+        return self.found is not None or self.cancelled
+
+    # Si la plantilla del bloque cambio, actualiza el motor de hashing. Retorna True si cambio
+    def refresh(self):
+        prefix = self.block.mining_prefix()
+        if prefix == self.prefix:
+            return False
+        self.prefix = prefix
+        self.engine = HashEngine(prefix, self.block.target)
+        self.refreshes = self.refreshes + 1
+        return True
+
+    # Mina hasta encontrar un nonce (lo guarda en el bloque y lo retorna), hasta probar
+    # max_attempts nonces en total o hasta que se cancele (en esos casos retorna None)
+    def run(self, max_attempts=None):
+        while self.found is None:
+            # lo que interrumpio el tramo anterior no debe cortar este. Se limpia antes de esperar:
+            # una pausa que llegue despues vuelve a activar _stop y no se pierde
+            self._stop.clear()
+            self._resume.wait()
+            if self.cancelled:
+                return None
+            if max_attempts is not None and self.attempts >= max_attempts:
+                return None
+            self.refresh()
+            # si se pauso mientras se actualizaba la plantilla se vuelve a esperar
+            if self.paused():
+                continue
+
+            count = self.chunk
+            if max_attempts is not None:
+                count = min(count, max_attempts - self.attempts)
+            nonce, tried = self.engine.search(self.next_nonce, count, self._stop)
+            with self.lock:
+                self.next_nonce = self.next_nonce + tried
+                self.attempts = self.attempts + tried
+
+            # si el bloque cambio mientras se buscaba, el nonce encontrado ya no sirve
+            if nonce is not None and not self.refresh():
+                self.found = nonce
+                self.block.nonce = nonce
+        return self.found
+
+    # Corre el trabajo en un hilo aparte y retorna el hilo
+    def start(self, max_attempts=None):
+        thread = threading.Thread(target=self.run, args=(max_attempts,), daemon=True)
+        thread.start()
+        return thread
+
+    # Progreso del trabajo, alcanza para retomarlo con restore
+    def checkpoint(self):
+        with self.lock:
+            return {
+                'prefix': self.prefix.hex(),
+                'next_nonce': self.next_nonce,
+                'attempts': self.attempts,
+                'refreshes': self.refreshes,
+                'found': self.found,
+            }
+
+    # Guarda el checkpoint en un archivo (reemplazo atomico)
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(tmp, path)
+
+    # Retoma un trabajo desde un checkpoint (un diccionario o un archivo guardado con save).
+    # Si la plantilla del bloque cambio desde entonces se sigue igual desde el mismo nonce
+    @classmethod
+    def restore(cls, block, checkpoint, chunk=MINING_CHUNK):
+        if not isinstance(checkpoint, dict):
+            with open(checkpoint) as f:
+                checkpoint = json.load(f)
+        job = cls(block, start=checkpoint['next_nonce'], chunk=chunk)
+        job.attempts = checkpoint['attempts']
+        job.refreshes = checkpoint['refreshes']
+        if job.prefix.hex() != checkpoint['prefix']:
+            job.refreshes = job.refreshes + 1
+        return job
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import time
+
+    from Signatures import generate_keys
+    from Transactions import Tx
+    from TxBlock import TxBlock
+
+    pr1, pu1 = generate_keys()
+    pr2, pu2 = generate_keys()
+
+    def make_tx(amount):
+        tx = Tx()
+        tx.add_input(pu1, amount)
+        tx.add_output(pu2, amount)
+        tx.sign(pr1)
+        return tx
+
+    block = TxBlock(None)
+    block.addTx(make_tx(1))
+    job = MiningJob(block)
+    thread = job.start()
+
+    # Pausamos: mientras esta en pausa no avanza
+    time.sleep(0.2)
+    job.pause()
+    time.sleep(0.1)
+    attempts = job.attempts
+    time.sleep(0.2)
+    if job.done() or job.attempts == attempts:
+        print("Success! Paused at nonce " + str(job.next_nonce))
+    else:
+        print("ERROR! Job kept mining while paused")
+    job.save("mining.json")
+
+    # Agregamos una transaccion con el trabajo en curso: se actualiza la plantilla y sigue
+    block.addTx(make_tx(2))
+    job.resume()
+    thread.join(120)
+    if job.found is not None and block.good_nonce() and job.refreshes > 0:
+        print("Success! Nonce found for the refreshed template after " + str(job.attempts) + " attempts")
+    elif job.found is None:
+        print("Mining did not finish, " + str(job.attempts) + " attempts")
+    elif job.refreshes == 0:
+        # el nonce salio antes de la pausa, la transaccion se agrego despues de terminar
+        print("Nonce found before the template changed, " + str(job.attempts) + " attempts")
+    else:
+        print("ERROR! Bad nonce for the refreshed template")
+
+    # Retomamos desde el checkpoint guardado durante la pausa
+    resumed = MiningJob.restore(block, "mining.json")
+    if resumed.next_nonce == json.load(open("mining.json"))['next_nonce'] and resumed.refreshes > 0:
+        print("Success! Job restored from checkpoint at nonce " + str(resumed.next_nonce))
+    else:
+        print("ERROR! Checkpoint not restored")
+
+    # Cancelamos un trabajo en curso
+    other = TxBlock(block)
+    other.addTx(make_tx(3))
+    job = MiningJob(other)
+    thread = job.start()
+    time.sleep(0.1)
+    start = time.time()
+    job.cancel()
+    thread.join(5)
+    if not thread.is_alive() and (job.found is None or other.good_nonce()):
+        print("Success! Job cancelled in " + str(round((time.time() - start) * 1000, 2)) + " ms")
+    else:
+        print("ERROR! Job was not cancelled")
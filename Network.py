@@ -0,0 +1,378 @@
+#Network.py
+
+"""
+    El siguiente codigo simula una red local de nodos que intercambian transacciones y bloques.
+    * Todo corre en un solo proceso sobre asyncio, sin red externa: cada conexion entre dos nodos
+    tiene una latencia y un ancho de banda simulados, un mensaje llega despues de esperar a que la
+    conexion quede libre, el tiempo de enviar sus bytes y la latencia.
+    * Las transacciones se propagan por gossip: cada nodo valida la transaccion que recibe, la
+    agrega a su mempool y la reenvia a los peers que todavia no la conocen.
+    * Los bloques se envian compactos: la cabecera (ver Headers.py) y los IDs de las transacciones,
+    mas las transacciones que los peers no pueden tener (la recompensa del minero). Cada peer arma
+    el bloque con las transacciones de su mempool y solo pide las que le faltan. Tambien se pueden
+    enviar completos (compact=False) para comparar.
+    * La red registra cuando llega cada bloque a cada nodo y los bytes enviados por tipo de mensaje,
+    asi se mide la latencia de propagacion y el ancho de banda segun el tamaño de los bloques.
+    * Los bloques de la simulacion no se minan: su propagacion no depende del nonce.
+"""
+import asyncio
+
+import Encoding
+from Mempool import Mempool
+from TxBlock import TxBlock
+
+# Latencia de cada conexion (en segundos)
+LATENCY = 0.02
+# Ancho de banda de cada conexion (en bytes por segundo)
+BANDWIDTH = 1000000
+
+
+# Tamaño en bytes de los mensajes
+def tx_size(tx):
+    return len(tx.encode())
+
+def header_size(header):
+    return len(Encoding.encode_header(header.previousHash, header.merkle_root,
+                                      header.timestamp, header.target)) + len(Encoding.encode_nonce(header.nonce))
+
+
+# Conexion en un sentido entre dos nodos
+class Link:
+
+    def __init__(self, latency=LATENCY, bandwidth=BANDWIDTH):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        # momento en que la conexion termina de enviar lo que tiene en cola
+        self.busy_until = 0.0
+        self.bytes = 0
+        self.messages = 0
+
+    # Demora hasta que llega un mensaje de size bytes enviado en el momento now
+    def delay(self, now, size):
+        start = max(now, self.busy_until)
+        self.busy_until = start + size / self.bandwidth
+        self.bytes = self.bytes + size
+        self.messages = self.messages + 1
+        return self.busy_until + self.latency - now
+
+
+class SimNode:
+
+    def __init__(self, name, network, reward_address=None):
+        self.name = name
+        self.network = network
+        self.reward_address = reward_address
+        self.mempool = Mempool()
+        # bloques aceptados, indexados por su hash, y la punta de la cadena
+        self.blocks = {}
+        self.tip = None
+        # hashes e IDs que conoce cada peer (porque los envio o porque se los enviamos)
+        self.peers = {}
+        # bloques compactos que esperan transacciones: hash -> (cabecera, txids, transacciones)
+        self.pending = {}
+        self.inbox = asyncio.Queue()
+        self.task = None
+
+    def __repr__(self):
+        return "SimNode(" + self.name + ")"
+
+    async def run(self):
+        while True:
+            kind, sender, payload = await self.inbox.get()
+            try:
+                getattr(self, '_on_' + kind)(sender, payload)
+            except Exception as e:
+                print("Error handling " + kind + " in " + self.name + ": " + repr(e))
+            finally:
+                self.network.delivered()
+
+    # Envia un mensaje a un peer y recuerda que el peer ya conoce ese objeto
+    def __send(self, peer, kind, payload, size, known=None):
+        if known is not None:
+            self.peers[peer].add(known)
+        self.network.send(self, peer, kind, payload, size)
+
+    # Envia un objeto a todos los peers que no lo conocen
+    def __relay(self, key, kind, payload, size, source=None):
+        for peer, known in self.peers.items():
+            if peer is not source and key not in known:
+                self.__send(peer, kind, payload, size, key)
+
+    ############ transacciones ############
+
+    # Valida y agrega una transaccion al mempool, si es nueva la reenvia a los peers
+    def add_tx(self, tx, source=None):
+        txid = tx.txid()
+        if source is not None:
+            self.peers[source].add(txid)
+        if txid in self.mempool or not self.mempool.add(tx):
+            return False
+        self.__relay(txid, 'tx', tx, tx_size(tx), source)
+        return True
+
+    def _on_tx(self, sender, tx):
+        self.add_tx(tx, sender)
+
+    ############ bloques ############
+
+    # Arma un bloque con las transacciones del mempool (de mayor comision) sobre la punta
+    def assemble_block(self, max_txs=None):
+        return self.mempool.assemble_block(self.tip, max_txs=max_txs, reward_address=self.reward_address)
+
+    # Acepta un bloque (si es valido y extiende la cadena conocida) y lo reenvia a los peers
+    def add_block(self, block, source=None):
+        block_hash = block.computeHash()
+        if source is not None:
+            self.peers[source].add(block_hash)
+        if block_hash in self.blocks or not block.is_valid():
+            return False
+        self.blocks[block_hash] = block
+        if self.tip is None or block.height > self.tip.height:
+            self.tip = block
+        self.mempool.remove_block(block)
+        self.network.arrived(self, block_hash)
+
+        if self.network.compact:
+            header = block.header()
+            txids = [tx.txid() for tx in block.data]
+            # la recompensa (sin entradas) no puede estar en el mempool de nadie, va incluida
+            prefilled = dict((i, tx) for i, tx in enumerate(block.data) if not tx.inputs)
+            size = header_size(header) + Encoding.HASH_SIZE * len(txids) \
+                + sum(tx_size(tx) for tx in prefilled.values())
+            self.__relay(block_hash, 'compact', (header, txids, prefilled), size, source)
+        else:
+            size = header_size(block.header()) + sum(tx_size(tx) for tx in block.data)
+            self.__relay(block_hash, 'block', (block.header(), list(block.data)), size, source)
+        return True
+
+    # Arma el bloque de una cabecera con sus transacciones, retorna None si no coincide
+    # con la cabecera o no se conoce el bloque anterior
+    def __rebuild(self, header, txs):
+        parent = None
+        if header.previousHash is not None:
+            parent = self.blocks.get(header.previousHash)
+            if parent is None:
+                return None
+        block = TxBlock(parent)
+        block.timestamp = header.timestamp
+        block.target = header.target
+        block.nonce = header.nonce
+        for tx in txs:
+            block.addTx(tx)
+        if block.computeHash() != header.hash():
+            return None
+        return block
+
+    def _on_block(self, sender, payload):
+        header, txs = payload
+        block = self.__rebuild(header, txs)
+        if block is not None:
+            self.add_block(block, sender)
+
+    def _on_compact(self, sender, payload):
+        header, txids, prefilled = payload
+        block_hash = header.hash()
+        self.peers[sender].add(block_hash)
+        if block_hash in self.blocks or block_hash in self.pending:
+            return
+        txs = [prefilled.get(i) or self.mempool.get(txid) for i, txid in enumerate(txids)]
+        missing = [i for i, tx in enumerate(txs) if tx is None]
+        if missing:
+            # pedimos al peer solo las transacciones que no estan en el mempool
+            self.pending[block_hash] = (header, txids, txs)
+            self.__send(sender, 'get_txs', (block_hash, missing),
+                        Encoding.HASH_SIZE + 4 * len(missing))
+            return
+        block = self.__rebuild(header, txs)
+        if block is not None:
+            self.add_block(block, sender)
+
+    def _on_get_txs(self, sender, payload):
+        block_hash, missing = payload
+        block = self.blocks.get(block_hash)
+        if block is None:
+            return
+        txs = [block.data[i] for i in missing]
+        self.__send(sender, 'txs', (block_hash, missing, txs),
+                    Encoding.HASH_SIZE + sum(tx_size(tx) for tx in txs))
+
+    def _on_txs(self, sender, payload):
+        block_hash, missing, received = payload
+        entry = self.pending.pop(block_hash, None)
+        if entry is None:
+            return
+        header, txids, txs = entry
+        for i, tx in zip(missing, received):
+            if tx.txid() != txids[i] or not tx.is_valid():
+                return
+            txs[i] = tx
+        block = self.__rebuild(header, txs)
+        if block is not None:
+            self.add_block(block, sender)
+
+
+class Network:
+
+    def __init__(self, latency=LATENCY, bandwidth=BANDWIDTH, compact=True):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.compact = compact
+        self.nodes = []
+        # conexiones en cada sentido: (origen, destino) -> Link
+        self.links = {}
+        # bytes enviados por tipo de mensaje
+        self.bytes = {}
+        # momento en que cada bloque llego a cada nodo: hash -> {nombre: tiempo}
+        self.arrivals = {}
+        # mensajes enviados que todavia no se procesaron
+        self.in_flight = 0
+        self.idle = None
+
+    def add_node(self, name, reward_address=None):
+        node = SimNode(name, self, reward_address)
+        self.nodes.append(node)
+        return node
+
+    def connect(self, a, b):
+        if b in a.peers:
+            return
+        a.peers[b] = set()
+        b.peers[a] = set()
+        self.links[(a, b)] = Link(self.latency, self.bandwidth)
+        self.links[(b, a)] = Link(self.latency, self.bandwidth)
+
+    async def start(self):
+        self.idle = asyncio.Event()
+        self.idle.set()
+        for node in self.nodes:
+            node.task = asyncio.create_task(node.run())
+
+    async def stop(self):
+        for node in self.nodes:
+            node.task.cancel()
+        await asyncio.gather(*[node.task for node in self.nodes], return_exceptions=True)
+
+    # Programa la entrega de un mensaje segun la latencia y el ancho de banda de la conexion
+    def send(self, src, dst, kind, payload, size):
+        loop = asyncio.get_running_loop()
+        delay = self.links[(src, dst)].delay(loop.time(), size)
+        self.bytes[kind] = self.bytes.get(kind, 0) + size
+        self.in_flight = self.in_flight + 1
+        self.idle.clear()
+        loop.call_later(delay, dst.inbox.put_nowait, (kind, src, payload))
+
+    def delivered(self):
+        self.in_flight = self.in_flight - 1
+        if self.in_flight == 0:
+            self.idle.set()
+
+    def arrived(self, node, block_hash):
+        now = asyncio.get_running_loop().time()
+        self.arrivals.setdefault(block_hash, {})[node.name] = now
+
+    # Espera a que no queden mensajes en viaje
+    async def settle(self):
+        await self.idle.wait()
+
+    # Total de bytes enviados de los tipos de mensaje dados (todos si no se indican)
+    def total_bytes(self, kinds=None):
+        return sum(size for kind, size in self.bytes.items() if kinds is None or kind in kinds)
+
+    # Publica un bloque desde un nodo y espera a que se propague.
+    # Retorna el tiempo hasta que llego al ultimo nodo (None si no llego a todos)
+    # y los bytes enviados para propagarlo
+    async def propagate(self, node, block):
+        before = self.total_bytes(('block', 'compact', 'get_txs', 'txs'))
+        node.add_block(block)
+        await self.settle()
+        sent = self.total_bytes(('block', 'compact', 'get_txs', 'txs')) - before
+        times = self.arrivals.get(block.computeHash(), {})
+        if len(times) < len(self.nodes):
+            return None, sent
+        return max(times.values()) - min(times.values()), sent
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import random
+
+    from Signatures import generate_keys
+    from Transactions import Tx
+
+    keys = [generate_keys() for i in range(4)]
+    pr_miner, pu_miner = generate_keys()
+
+    def make_txs(n):
+        txs = []
+        for i in range(n):
+            pr_from, pu_from = keys[i % len(keys)]
+            pr_to, pu_to = keys[(i + 1) % len(keys)]
+            tx = Tx()
+            tx.add_input(pu_from, 1 + i / 1000 + 0.01)
+            tx.add_output(pu_to, 1 + i / 1000)
+            tx.sign(pr_from)
+            txs.append(tx)
+        return txs
+
+    # 8 nodos en anillo mas dos conexiones al azar por nodo
+    def make_network(compact):
+        network = Network(compact=compact)
+        nodes = [network.add_node("node" + str(i), pu_miner) for i in range(8)]
+        rng = random.Random(1)
+        for i, node in enumerate(nodes):
+            network.connect(node, nodes[(i + 1) % len(nodes)])
+            for j in rng.sample(range(len(nodes)), 2):
+                if j != i:
+                    network.connect(node, nodes[j])
+        return network, nodes
+
+    # Propaga un bloque de n transacciones, `hidden` de ellas solo las conoce el minero
+    async def simulate(txs, compact, hidden=0):
+        network, nodes = make_network(compact)
+        await network.start()
+        origin = nodes[0]
+        rng = random.Random(2)
+        for tx in txs[hidden:]:
+            rng.choice(nodes).add_tx(tx)
+        for tx in txs[:hidden]:
+            origin.mempool.add(tx)
+        await network.settle()
+        gossip = network.total_bytes(('tx',))
+
+        block = origin.assemble_block()
+        latency, sent = await network.propagate(origin, block)
+        same_tip = all(node.tip is not None and node.tip.computeHash() == block.computeHash() for node in nodes)
+        await network.stop()
+        return latency, sent, gossip, same_tip
+
+    async def main():
+        ok = True
+        for size in (10, 100, 400):
+            txs = make_txs(size)
+            results = {}
+            for compact in (True, False):
+                latency, sent, gossip, same_tip = await simulate(txs, compact)
+                ok = ok and same_tip and latency is not None
+                results[compact] = sent
+                print("block of " + str(size) + " txs, " + ("compact" if compact else "full   ") + ": "
+                      + str(round(latency * 1000, 1)) + " ms, " + str(sent) + " bytes"
+                      + " (tx gossip: " + str(gossip) + " bytes)")
+            if results[True] >= results[False]:
+                ok = False
+
+        if ok:
+            print("Success! Blocks reached every node, compact relay sends fewer bytes")
+        else:
+            print("ERROR! Block propagation failed")
+
+        # Si los peers no tienen algunas transacciones las piden al armar el bloque
+        txs = make_txs(100)
+        latency, sent, gossip, same_tip = await simulate(txs, True, hidden=10)
+        if same_tip:
+            print("Success! Missing transactions requested: " + str(round(latency * 1000, 1)) + " ms, "
+                  + str(sent) + " bytes")
+        else:
+            print("ERROR! Block with missing transactions was not rebuilt")
+
+    asyncio.run(main())
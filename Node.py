@@ -0,0 +1,201 @@
+#Node.py
+
+"""
+    El siguiente codigo modela un nodo con una API asyncio.
+    * Todo el proyecto es sincrono: un find_nonce lento o un TxBlock.is_valid grande bloquean todo lo
+    demas. El nodo expone corrutinas para enviar transacciones, validar bloques y empezar o cancelar
+    el minado, y manda el trabajo pesado (firmas y hashes) a executors configurables, asi el event
+    loop sigue respondiendo.
+    * Las transacciones enviadas pasan por una cola de tamaño limitado: si esta llena, submit_tx
+    espera (backpressure) o, con wait=False, lanza asyncio.QueueFull.
+    * El minado se hace por tramos de nonces, entre tramo y tramo se puede cancelar.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from Mempool import Mempool
+from TxBlock import HashEngine
+
+# Tamaño de la cola de transacciones pendientes de validar
+QUEUE_SIZE = 1000
+# Cantidad de tareas que validan transacciones de la cola
+VALIDATORS = 4
+# Cantidad de nonces que se prueban en cada tramo de minado
+MINING_CHUNK = 10000
+
+
+# Prueba un tramo de nonces, es una funcion de modulo para poder usarla tambien
+# con un ProcessPoolExecutor
+def _search_chunk(prefix, target, start, count):
+    return HashEngine(prefix, target).search(start, count)
+
+
+class Node:
+
+    def __init__(self, crypto_executor=None, hash_executor=None, queue_size=QUEUE_SIZE,
+                 validators=VALIDATORS, mining_chunk=MINING_CHUNK):
+        self.mempool = Mempool()
+        # executor para verificar firmas y executor para el minado
+        self.crypto_executor = crypto_executor or ThreadPoolExecutor()
+        self.hash_executor = hash_executor or ThreadPoolExecutor(max_workers=1)
+        self.queue_size = queue_size
+        self.validators = validators
+        self.mining_chunk = mining_chunk
+        self.queue = None
+        self.tasks = []
+        self.mining_task = None
+
+    # Inicia las tareas que validan las transacciones de la cola
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        for i in range(self.validators):
+            self.tasks.append(asyncio.create_task(self.__validator()))
+
+    async def stop(self):
+        self.cancel_mining()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    # Envia una transaccion al nodo. Retorna un futuro que se resuelve con True si la
+    # transaccion fue admitida en el mempool. Si la cola esta llena espera a que haya lugar,
+    # o con wait=False lanza asyncio.QueueFull. El nodo debe estar iniciado (start)
+    async def submit_tx(self, tx, wait=True):
+        # sin las tareas validadoras la transaccion nunca se procesaria
+        if self.queue is None:
+            raise RuntimeError("Node is not started, call start() before submit_tx")
+        result = asyncio.get_running_loop().create_future()
+        if wait:
+            await self.queue.put((tx, result))
+        else:
+            self.queue.put_nowait((tx, result))
+        return result
+
+    async def __validator(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            tx, result = await self.queue.get()
+            try:
+                admitted = False
+                if tx.txid() not in self.mempool:
+                    # las firmas se verifican en el executor, el mempool solo se toca
+                    # desde el event loop
+                    if await loop.run_in_executor(self.crypto_executor, tx.is_valid):
+                        admitted = self.mempool.add(tx, validated=True)
+                if not result.done():
+                    result.set_result(admitted)
+            except Exception as e:
+                if not result.done():
+                    result.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    # Valida un bloque en el executor de firmas
+    async def validate_block(self, block, workers=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.crypto_executor,
+                                          functools.partial(block.is_valid, workers=workers))
+
+    # Empieza a minar un bloque en segundo plano, retorna la tarea (su resultado es el nonce)
+    def start_mining(self, block, attempts=None):
+        self.cancel_mining()
+        self.mining_task = asyncio.create_task(self.__mine(block, attempts))
+        return self.mining_task
+
+    def cancel_mining(self):
+        if self.mining_task is not None and not self.mining_task.done():
+            self.mining_task.cancel()
+        self.mining_task = None
+
+    async def __mine(self, block, attempts):
+        loop = asyncio.get_running_loop()
+        prefix = block.mining_prefix()
+        nonce = 0
+        while attempts is None or nonce < attempts:
+            count = self.mining_chunk
+            if attempts is not None:
+                count = min(count, attempts - nonce)
+            found, tried = await loop.run_in_executor(self.hash_executor, _search_chunk,
+                                                      prefix, block.target, nonce, count)
+            if found is not None:
+                block.nonce = found
+                return found
+            nonce = nonce + count
+        return None
+
+
+################## BLOQUE MAIN ############################
+
+if __name__ == "__main__":
+    import time
+
+    from Signatures import generate_keys
+    from Transactions import Tx
+    from TxBlock import TxBlock
+
+    async def main():
+        pr1, pu1 = generate_keys()
+        pr2, pu2 = generate_keys()
+
+        node = Node(queue_size=10)
+        # Antes de start no hay tareas que validen la cola
+        try:
+            await node.submit_tx(Tx())
+            print("ERROR! Transaction submitted to a node that is not started")
+        except RuntimeError:
+            print("Success! Node not started")
+        await node.start()
+
+        # Mientras se mina, medimos cuanto tarda el event loop en responder
+        block = TxBlock(None)
+        mining = node.start_mining(block)
+        lag = 0.0
+        for i in range(20):
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - start - 0.01)
+        print("max event loop lag while mining: " + str(round(lag * 1000, 2)) + " ms")
+
+        # Enviamos transacciones, la cola tiene lugar para 10 asi que hay backpressure
+        results = []
+        for i in range(30):
+            tx = Tx()
+            tx.add_input(pu1, 1 + i / 100)
+            tx.add_output(pu2, 1)
+            tx.sign(pr1)
+            results.append(await node.submit_tx(tx))
+        admitted = await asyncio.gather(*results)
+        if all(admitted) and len(node.mempool) == 30:
+            print("Success! 30 transactions admitted")
+        else:
+            print("ERROR! Only " + str(len(node.mempool)) + " transactions admitted")
+
+        # Una transaccion mal firmada se rechaza
+        bad = Tx()
+        bad.add_input(pu1, 1)
+        bad.add_output(pu2, 1)
+        bad.sign(pr2)
+        if not await (await node.submit_tx(bad)):
+            print("Success! Bad transaction rejected")
+        else:
+            print("ERROR! Bad transaction admitted")
+
+        node.cancel_mining()
+        try:
+            nonce = await mining
+            print("Mining finished before it was cancelled, nonce: " + str(nonce))
+        except asyncio.CancelledError:
+            print("Success! Mining cancelled")
+
+        # Validamos un bloque armado desde el mempool
+        candidate = node.mempool.assemble_block(None, max_txs=10, reward_address=pu2)
+        if await node.validate_block(candidate, workers=4):
+            print("Success! Block validated")
+        else:
+            print("ERROR! Block validation failed")
+
+        await node.stop()
+
+    asyncio.run(main())
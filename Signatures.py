@@ -5,58 +5,70 @@
     Las firms digitales son escenciales para comprobar si un bloque o una transaccion es valida
     Se utilizan distinatas librerias de Criptography apara obtener la serializacion, los hashes
     y los distintos algoritmos de encriptado
+    * Los esquemas de firma son intercambiables: RSA-2048 con PSS (el original), Ed25519 y ECDSA P-256.
+    Las direcciones RSA siguen siendo la clave publica en PEM, las de Ed25519 y ECDSA son un byte
+    con el esquema (tag) seguido de la clave publica compacta (32 y 33 bytes), asi las transacciones
+    RSA existentes siguen siendo validas y las nuevas son mucho mas pequeñas.
 """
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import ed25519
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import serialization
 
-# Es la encargada de generar un par de llaves publicas y privadas
-def generate_keys():
-    private = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )    
-    #se genera la clave publica a partir de la privada
-    public = private.public_key()
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+
+import Encoding
+import KeyRegistry
+
+# Cantidad maxima de claves publicas deserializadas que se guardan en memoria
+KEY_CACHE_SIZE = 1024
+
+# Esquema RSA-2048 con padding PSS, las direcciones son la clave publica en PEM
+class RSAScheme:
+
+    name = 'rsa'
+
+    def generate(self):
+        return rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+            backend=default_backend()
+        )
+
+    def owns(self, private):
+        return isinstance(private, rsa.RSAPrivateKey)
 
     # serializamos la clave publica, es nercesario serializar con RSA para que no este en formato hexadecimal...
     # y pase a bytes, retornamos esa clave serializada
-    pu_ser = public.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )    
-    return private, pu_ser
+    def address(self, public):
+        return public.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
 
-# Es la encargada de firmar digitalmente (encriptar) datos dada una clave privada
-def sign(message, private):
-    message = bytes(str(message), 'utf-8')
-    sig = private.sign(
-        message,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
-    return sig
+    def load(self, address):
+        return serialization.load_pem_public_key(
+            address,
+            backend=default_backend()
+        )
 
-# Es la encargada de verificar si los datos enviados no han sido alterados, dada una firma
-# y una clave publica, la clave publica debe ser de la misma persona que los encripto
-def verify(message, sig, pu_ser):
+    def sign(self, message, private):
+        return private.sign(
+            message,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
 
-	# para verificar la firma, debemos enviar la clave publica serializada
-	# y en estas lineas la deserializamos, convertimos de nuevo a bytes
-    public = serialization.load_pem_public_key(
-        pu_ser,
-        backend=default_backend()
-    )
-    
-    message = bytes(str(message), 'utf-8')
-    try:
+    def verify(self, message, sig, public):
         public.verify(
             sig,
             message,
@@ -66,12 +78,238 @@ def verify(message, sig, pu_ser):
             ),
             hashes.SHA256()
         )
+
+
+# Esquema Ed25519, la direccion es el tag + la clave publica de 32 bytes
+class Ed25519Scheme:
+
+    name = 'ed25519'
+    tag = 0x01
+
+    def generate(self):
+        return ed25519.Ed25519PrivateKey.generate()
+
+    def owns(self, private):
+        return isinstance(private, ed25519.Ed25519PrivateKey)
+
+    def address(self, public):
+        return bytes([self.tag]) + public.public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+
+    def load(self, address):
+        return ed25519.Ed25519PublicKey.from_public_bytes(address[1:])
+
+    def sign(self, message, private):
+        return private.sign(message)
+
+    def verify(self, message, sig, public):
+        public.verify(sig, message)
+
+
+# Esquema ECDSA sobre la curva P-256 con SHA-256, la direccion es el tag + el punto comprimido (33 bytes)
+class ECDSAScheme:
+
+    name = 'ecdsa'
+    tag = 0x02
+
+    def generate(self):
+        return ec.generate_private_key(ec.SECP256R1(), backend=default_backend())
+
+    def owns(self, private):
+        return isinstance(private, ec.EllipticCurvePrivateKey)
+
+    def address(self, public):
+        return bytes([self.tag]) + public.public_bytes(
+            encoding=serialization.Encoding.X962,
+            format=serialization.PublicFormat.CompressedPoint
+        )
+
+    def load(self, address):
+        return ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), address[1:])
+
+    def sign(self, message, private):
+        return private.sign(message, ec.ECDSA(hashes.SHA256()))
+
+    def verify(self, message, sig, public):
+        public.verify(sig, message, ec.ECDSA(hashes.SHA256()))
+
+
+# Esquemas disponibles, por nombre y por tag
+SCHEMES = {}
+TAGS = {}
+
+def register_scheme(scheme):
+    SCHEMES[scheme.name] = scheme
+    if hasattr(scheme, 'tag'):
+        TAGS[scheme.tag] = scheme
+
+register_scheme(RSAScheme())
+register_scheme(Ed25519Scheme())
+register_scheme(ECDSAScheme())
+
+# Esquema usado por defecto al generar claves
+DEFAULT_SCHEME = 'rsa'
+
+# Esquema de una direccion: las direcciones PEM son RSA, las demas empiezan con el tag
+def scheme_for_address(address):
+    if address.startswith(b'-----BEGIN'):
+        return SCHEMES['rsa']
+    scheme = TAGS.get(address[0]) if address else None
+    if scheme is None:
+        raise ValueError("Unknown signature scheme for address")
+    return scheme
+
+# Esquema de una clave privada
+def scheme_for_private(private):
+    for scheme in SCHEMES.values():
+        if scheme.owns(private):
+            return scheme
+    raise ValueError("Unknown signature scheme for private key")
+
+
+# Es la encargada de generar un par de llaves publicas y privadas
+def generate_keys(scheme=DEFAULT_SCHEME):
+    private = SCHEMES[scheme].generate()
+    #se genera la clave publica a partir de la privada
+    return private, public_address(private)
+
+# Retorna la direccion (clave publica serializada) que corresponde a una clave privada
+def public_address(private):
+    return scheme_for_private(private).address(private.public_key())
+
+# Huella de una direccion: el hash SHA-256 de la clave publica serializada
+# (ver KeyRegistry.py, una huella se retorna tal cual)
+def fingerprint(pu_ser):
+    return KeyRegistry.fingerprint(pu_ser)
+
+# Convierte el mensaje a bytes, los mensajes binarios (ver Encoding.py) se firman tal cual
+def _message_bytes(message):
+    if isinstance(message, bytes):
+        return message
+    return bytes(str(message), 'utf-8')
+
+# Es la encargada de firmar digitalmente (encriptar) datos dada una clave privada
+def sign(message, private):
+    message = _message_bytes(message)
+    return scheme_for_private(private).sign(message, private)
+
+# Deserializa una clave publica. Las claves ya deserializadas se guardan en un cache LRU
+# indexado por la direccion, asi una misma direccion no se vuelve a parsear en cada firma
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def load_public_key(pu_ser):
+    return scheme_for_address(pu_ser).load(pu_ser)
+
+
+# Cache opcional de resultados de verificacion.
+# La clave es el hash de (mensaje, firma, clave publica) y el valor si la firma es valida,
+# al superar maxsize se descartan las entradas usadas hace mas tiempo
+class VerifyCache:
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # las tres partes se codifican con prefijo de longitud para que no se puedan confundir
+    def key(self, message, sig, pu_ser):
+        return Encoding.sha256(Encoding.field(message), Encoding.field(sig), Encoding.field(pu_ser))
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses = self.misses + 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits = self.hits + 1
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
+
+
+# Cache de verificaciones en uso, None si esta desactivado
+_verify_cache = None
+
+# Activa el cache de verificaciones con un tamaño maximo
+def enable_verify_cache(maxsize=100000):
+    global _verify_cache
+    _verify_cache = VerifyCache(maxsize)
+    return _verify_cache
+
+def disable_verify_cache():
+    global _verify_cache
+    _verify_cache = None
+
+# Estadisticas de ambos caches (claves publicas y verificaciones)
+def cache_stats():
+    info = load_public_key.cache_info()
+    stats = {'keys': {'size': info.currsize, 'maxsize': info.maxsize,
+                      'hits': info.hits, 'misses': info.misses}}
+    if _verify_cache is not None:
+        stats['verify'] = _verify_cache.stats()
+    return stats
+
+
+# Es la encargada de verificar si los datos enviados no han sido alterados, dada una firma
+# y una clave publica, la clave publica debe ser de la misma persona que los encripto
+def verify(message, sig, pu_ser):
+    message = _message_bytes(message)
+
+    # si el cache esta activo y ya verificamos esta misma firma, retornamos el resultado
+    cache = _verify_cache
+    if cache is not None:
+        key = cache.key(message, sig, pu_ser)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    result = _verify(message, sig, pu_ser)
+    if cache is not None and result is not None:
+        cache.put(key, result)
+    return result is True
+
+# Verificacion sin cache, retorna None si ocurrio un error inesperado (ese resultado no se guarda)
+def _verify(message, sig, pu_ser):
+
+    # las transacciones guardan la huella de la direccion, buscamos la clave completa
+    # en el registro. Una huella desconocida no puede verificar nada, pero la clave se
+    # puede registrar mas tarde, asi que ese resultado no se guarda en el cache
+    pu_ser = KeyRegistry.resolve(pu_ser)
+    if pu_ser is None:
+        return None
+
+	# para verificar la firma, debemos enviar la clave publica serializada
+	# y en estas lineas la deserializamos, convertimos de nuevo a bytes
+    scheme = scheme_for_address(pu_ser)
+    public = load_public_key(pu_ser)
+    
+    try:
+        scheme.verify(message, sig, public)
         return True
     except InvalidSignature:
         return False
     except:
         print("Error executing public_key.verify")
-        return False
+        return None
     
 
 ################## BLOQUE MAIN ############################
@@ -118,4 +356,21 @@ if __name__ == '__main__':
     if correct:
         print("ERROR! Tampered message checks out!")
     else:
-        print("Success! Tampering detected")
\ No newline at end of file
+        print("Success! Tampering detected")
+
+    # Activamos el cache de verificaciones, la segunda verificacion no repite el calculo RSA
+    enable_verify_cache()
+    verify(message, sig, pu)
+    if verify(message, sig, pu) and cache_stats()['verify']['hits'] == 1:
+        print("Success! Cached verification")
+    else:
+        print("ERROR! Verification cache miss")
+
+    # Los mismos pasos con los esquemas Ed25519 y ECDSA, las direcciones son mucho mas pequeñas
+    for scheme in ['ed25519', 'ecdsa']:
+        pr3, pu3 = generate_keys(scheme)
+        sig3 = sign(message, pr3)
+        if verify(message, sig3, pu3) and not verify(badmess, sig3, pu3) and not verify(message, sig, pu3):
+            print("Success! " + scheme + " signatures work, address is " + str(len(pu3)) + " bytes")
+        else:
+            print("ERROR! " + scheme + " signature check failed")
\ No newline at end of file
@@ -13,6 +13,26 @@
 """
 
 import Signatures
+import Encoding
+import KeyRegistry
+import Columnar
+
+# Campos que forman el mensaje firmado, al reasignarlos se invalida el mensaje guardado
+MESSAGE_FIELDS = ('inputs', 'outputs', 'reqd')
+# Campos que solo forman parte de la transaccion completa (y de su ID)
+SIG_FIELDS = ('sigs', 'signers')
+# Valores calculados que se guardan en memoria y no se almacenan al serializar (pickle)
+CACHE_FIELDS = ('_message', '_encoded', '_txid')
+
+
+# Una cantidad es valida si no es negativa, es finita (no NaN ni infinito) y esta dentro
+# del rango que se puede llevar en unidades base (ver Columnar.to_units)
+def valid_amount(amount):
+    try:
+        Columnar.to_units(amount)
+    except (ValueError, TypeError):
+        return False
+    return amount >= 0
 
 
 #Clase que modela una transaccion
@@ -24,112 +44,156 @@ class Tx:
     outputs =None
     #Lista de firmas
     sigs = None
+    #Huella de la clave publica que produjo cada firma (misma posicion que en sigs)
+    signers = None
     #Lista de firmas que no son entradas (transacciones custodiadas por terceros)
     reqd = None
 
+    # Mensaje firmado, transaccion codificada e ID ya calculados (None si hay que recalcularlos)
+    _message = None
+    _encoded = None
+    _txid = None
+
     #Constructor
     def __init__(self):
         # es más preciso que estas tres sean una lista de tuplas...
         # la tupla será, la direccion de la persona que hara la transaccion y el monto
-        self.inputs = []
-        self.outputs = []
-        self.sigs = []
-        self.reqd = []
+        # Se guardan como tuplas para que no se puedan modificar en el lugar
+        # (por ejemplo tx.outputs[0] = ...), solo con los metodos add_*
+        self.inputs = ()
+        self.outputs = ()
+        self.sigs = ()
+        self.signers = ()
+        self.reqd = ()
+
+    # Al reasignar un campo del mensaje se invalida el mensaje y el ID guardados,
+    # al reasignar las firmas solo la transaccion codificada y el ID
+    def __setattr__(self, name, value):
+        if name in MESSAGE_FIELDS:
+            object.__setattr__(self, '_message', None)
+        if name in MESSAGE_FIELDS or name in SIG_FIELDS:
+            object.__setattr__(self, '_encoded', None)
+            object.__setattr__(self, '_txid', None)
+        object.__setattr__(self, name, value)
+
+    # Los valores calculados no se guardan al serializar, se recalculan al cargar.
+    # Las direcciones son huellas, asi que se guardan tambien las claves completas de
+    # quienes firmaron (pickle guarda una sola vez cada clave repetida) para poder
+    # verificar las firmas en otro proceso o despues de cargar la transaccion de disco
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in CACHE_FIELDS:
+            state.pop(name, None)
+        keys = [KeyRegistry.resolve(signer) for signer in self.signers]
+        state['keys'] = tuple(key for key in keys if key is not None)
+        return state
+
+    # Al cargar se registran las claves de los firmantes (ver KeyRegistry.py)
+    def __setstate__(self, state):
+        state = dict(state)
+        for key in state.pop('keys', ()):
+            KeyRegistry.intern(key)
+        self.__dict__.update(state)
 
     # Encargada de añadir una entrada adicional a la lista,
     # requiere la direccion origen y la cantidad
+    # Las direcciones se guardan como la huella de la clave (ver KeyRegistry.py)
     def add_input(self, from_addr, amount):
-        self.inputs.append((from_addr, amount))
+        self.inputs = self.inputs + ((KeyRegistry.intern(from_addr), amount),)
 
     # Encargada de añadir una direccion de salida a la lista,
     # requiere la direccion destino y la cantidad
     def add_output(self, to_addr, amount):
-        self.outputs.append((to_addr, amount))
+        self.outputs = self.outputs + ((KeyRegistry.intern(to_addr), amount),)
 
     # Encargada de añadir una direccion de custodia a la lista
     def add_reqd(self, addr):
-        self.reqd.append(addr)
+        self.reqd = self.reqd + (KeyRegistry.intern(addr),)
 
     # Encargada de Firmar (aprobar) una transaccion, aqui comprobamos si
     # la clave privada enviada es valida
+    # Junto a la firma se guarda la huella de la clave publica de quien firma,
+    # asi al validar se sabe que firma corresponde a cada direccion
     def sign(self, private):
         message = self.__gather()
         newsig = Signatures.sign(message, private)
-        self.sigs.append(newsig) 
+        self.sigs = self.sigs + (newsig,)
+        self.signers = self.signers + (KeyRegistry.intern(Signatures.public_address(private)),)
 
     # Encargada de comprobar si un transaccion actual es valida o no
     # si es valida, se preocesa
     def is_valid(self):
         total_in = 0
         total_out = 0
-        message = self.__gather()
-
-        # debemos verificar que todas las entradas en la lista de entrada sean correctas
-        # que todas las personas en la lista de inputs, hayan firmado y la firma sea valida
 
+        # Primero las comprobaciones baratas: ninguna cantidad de entrada puede ser negativa,
+        # no finita o fuera de rango
         for address,amount in self.inputs:
-            found = False
-            # recorremos la lista de firmas
-            for sign in self.sigs:
-                #para comprobar si la firma es valida, Enviamos el mensaje, la firma y la direccion (llave publica)
-                if Signatures.verify(message, sign, address) :
-                    found = True
-
-            #si revisamos todas las firmas de una dirección en particular y no la encontramos, eso es falso.
-            if not found:
-                return False
-            if amount < 0:
+            if not valid_amount(amount):
                 return False
 
             # acumulamos el total de las monedas que seran enviadas
             total_in = total_in + amount
 
-        
-        # Ahora debemos comprobar que las firmas de los arbitros (transacciones de garantia)
-        # sean validas
-        for addr in self.reqd:
-            found = False
-            for s in self.sigs:
-                if Signatures.verify(message, s, addr) :
-                    found = True
-            if not found:
-                return False
-
         # Comprueba si las cantidades en la lista de salidas son menores a 0
         # Una persona no puede retirar monedas si no existen
         for addr,amount in self.outputs:
-            if amount < 0:
+            if not valid_amount(amount):
                 return False
             total_out = total_out + amount
 
+        # debemos verificar que todas las personas en la lista de inputs y todos los arbitros
+        # (transacciones de garantia) hayan firmado y la firma sea valida.
+        # Las firmas estan indexadas por la huella de quien firmo, asi que se hace una
+        # sola verificacion por firmante requerido y se termina en el primer fallo
+        message = self.__gather()
+        signed = dict(zip(self.signers, self.sigs))
+        required = [address for address, amount in self.inputs] + list(self.reqd)
+        for address in dict.fromkeys(required):
+            sig = signed.get(Signatures.fingerprint(address))
+            #para comprobar si la firma es valida, Enviamos el mensaje, la firma y la direccion (llave publica)
+            if sig is None or not Signatures.verify(message, sig, address):
+                return False
+
         return True
 
     # los datos necesarios para realizar la firma, son la recopilacion
-    # de las 3 listas involucradas en una transaccion, asi que unimos las tres listas
-    # en una sola
+    # de las 3 listas involucradas en una transaccion, codificadas en binario
+    # (ver Encoding.py). Se calcula una sola vez hasta que cambie alguna de las listas
     def __gather(self):
-        data=[]
-        data.append(self.inputs)
-        data.append(self.outputs)
-        data.append(self.reqd)
-        return data
+        if self._message is None:
+            self._message = Encoding.encode_tx_message(self.inputs, self.outputs, self.reqd)
+        return self._message
+
+    # Codificacion binaria completa de la transaccion (mensaje + firmas),
+    # es la que se usa al hashear un bloque
+    def encode(self):
+        if self._encoded is None:
+            self._encoded = Encoding.encode_tx(self.__gather(), self.sigs, self.signers)
+        return self._encoded
+
+    # ID de la transaccion: hash de la transaccion completa
+    def txid(self):
+        if self._txid is None:
+            self._txid = Encoding.sha256(self.encode())
+        return self._txid
     
     ## Encargada de representar las transacciones de forma legible
     def __repr__(self):
-        reprstr = "\nINPUTS:\n"
+        parts = ["\nINPUTS:\n"]
         for addr, amt in self.inputs:
-            reprstr = reprstr + str(amt) + " FROM " + str(addr) + "\n"
-        reprstr = reprstr + "\nOUTPUTS:\n"
+            parts.append(str(amt) + " FROM " + addr.hex() + "\n")
+        parts.append("\nOUTPUTS:\n")
         for addr, amt in self.outputs:
-            reprstr = reprstr + str(amt) + " TO " + str(addr) + "\n"
-        reprstr = reprstr + "\nREQD:\n"
+            parts.append(str(amt) + " TO " + addr.hex() + "\n")
+        parts.append("\nREQD:\n")
         for r in self.reqd:
-            reprstr = reprstr + str(r) + "\n"
-        reprstr = reprstr + "\nSIGS:\n"
-        for s in self.sigs:
-            reprstr = reprstr + str(s) + "\n"
-        reprstr = reprstr + "END\n\n"
-        return reprstr
+            parts.append(r.hex() + "\n")
+        parts.append("\nSIGS:\n")
+        for signer, s in zip(self.signers, self.sigs):
+            parts.append(signer.hex() + ": " + str(s) + "\n")
+        parts.append("END\n\n")
+        return ''.join(parts)
      
         
 ####################### MAIN CODE ##################################
@@ -263,6 +327,8 @@ if __name__ == "__main__":
         una vez que esto haya sido firmado, lo cambiaremos para enviar la moneda a pu3 en lugar de pu2, 
         nos referiremos al primer elemento de esa tupla que vamos a reemplazar con pu3.
         Esto es una cosa desagradable de pu3 que hacer. Así que vamos a ver si Tx9 se detecta con éxito.
+        Las listas se guardan como tuplas, asi que no se pueden modificar en el lugar,
+        el atacante tiene que reemplazar la lista completa.
     """
     # Modified Tx
     Tx9 = Tx()
@@ -271,13 +337,26 @@ if __name__ == "__main__":
     Tx9.sign(pr1)
     # outputs = [(pu2,1)]
     # change to [(pu3,1)]
-    Tx9.outputs[0] = (pu3,1)    #reemplazamos la tupla de la lista
+    try:
+        Tx9.outputs[0] = (pu3,1)    #reemplazamos la tupla de la lista
+        print("ERROR! Tx9 outputs modified in place")
+    except TypeError:
+        print("Success! Tx9 outputs can not be modified in place")
+    Tx9.outputs = ((pu3,1),)    #reemplazamos la lista completa
+
+    ######### Transaccion 10, transaccion con cantidades no finitas #########
+
+    # NaN no es menor a 0, pero tampoco es una cantidad valida
+    Tx10 = Tx()
+    Tx10.add_input(pu1, float('nan'))
+    Tx10.add_output(pu2, float('inf'))
+    Tx10.sign(pr1)
     
   
 
     #Comprobanmdo la invalidez
     print("Invalidez... \n")
-    for t, name in [(Tx4,'Tx4'), (Tx5,'Tx5'), (Tx6,'Tx6'), (Tx7,'Tx7'), (Tx8,'Tx8'), (Tx9,'Tx9')]:
+    for t, name in [(Tx4,'Tx4'), (Tx5,'Tx5'), (Tx6,'Tx6'), (Tx7,'Tx7'), (Tx8,'Tx8'), (Tx9,'Tx9'), (Tx10,'Tx10')]:
         if t.is_valid():
             print("ERROR! Bad "+name+" Is Valid \n")
         else:
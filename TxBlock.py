@@ -9,100 +9,274 @@
 
 
 
-from BlockChain import CBlock
+from BlockChain import CBlock, SealedBlockError, SEALED_FIELDS
 from Signatures import generate_keys, sign, verify
 from Transactions import Tx
+import Encoding
+import Merkle
+import Columnar
+import Difficulty
+from Headers import BlockHeader
+from BlockStore import BlockStore
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 
+import os
 import pickle
 import time
-import random
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # recompensa para el minero
 REWARD = 25.0
-# Numero de ceros inciales para el hash
-leading_zeros = 2
-# 
-next_char_limit = 20
+# Cada cuantos intentos un proceso minero revisa si otro ya encontro el nonce
+STOP_CHECK_INTERVAL = 1000
+
+
+# Motor de hashing para el minado.
+# El prefijo del bloque (transacciones + hash anterior) no cambia entre intentos, asi que se
+# hashea una sola vez (midstate) y en cada intento solo se copia ese estado y se agrega el nonce.
+# Los nonces son un contador entero, cada intento cuesta un update corto en lugar de
+# volver a serializar todo el bloque
+# El hash cumple la dificultad si como entero es menor o igual al objetivo (ver Difficulty.py)
+class HashEngine:
+
+    def __init__(self, prefix, target=Difficulty.INITIAL_TARGET):
+        self.target = target
+        # bytes del prefijo, se hashean una sola vez (para las metricas, ver Metrics.py)
+        self.prefix_size = len(prefix)
+        self.midstate = hashes.Hash(hashes.SHA256(), backend=default_backend())
+        self.midstate.update(prefix)
+
+    # calcula el hash del bloque para un nonce dado, igual al que calcula good_nonce
+    def hash_nonce(self, nonce):
+        digest = self.midstate.copy()
+        digest.update(Encoding.encode_nonce(nonce))
+        return digest.finalize()
+
+    # recorre los nonces [start, start + count) y retorna el primero valido (o None) y
+    # la cantidad de intentos realizados. Si se recibe un evento de parada se revisa
+    # cada STOP_CHECK_INTERVAL intentos
+    def search(self, start, count, stop_event=None):
+        midstate = self.midstate
+        target = self.target
+        attempts = 0
+        for nonce in range(start, start + count):
+            if stop_event is not None and attempts % STOP_CHECK_INTERVAL == 0 and stop_event.is_set():
+                break
+            attempts = attempts + 1
+            digest = midstate.copy()
+            digest.update(Encoding.encode_nonce(nonce))
+            if int.from_bytes(digest.finalize(), 'big') <= target:
+                return nonce, attempts
+        return None, attempts
+
+
+# Evento compartido entre los procesos mineros, se activa cuando alguno encuentra el nonce
+_stop_event = None
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+# Trabajo de un proceso minero: recorre su porcion [start, start + count) del espacio de nonces
+# y se detiene al encontrar un nonce valido o cuando otro proceso ya lo encontro.
+# Retorna el nonce (o None) junto a las estadisticas del proceso
+def _search_range(worker, prefix, target, start, count):
+    t0 = time.time()
+    found, attempts = HashEngine(prefix, target).search(start, count, _stop_event)
+    if found is not None:
+        _stop_event.set()
+    elapsed = time.time() - t0
+    stats = {
+        'worker': worker,
+        'attempts': attempts,
+        'elapsed': elapsed,
+        'rate': attempts / elapsed if elapsed > 0 else 0.0,
+    }
+    return found, stats
+
 
 class TxBlock (CBlock):
 
     nonce = "AAAAAAA"
+    # el hash del bloque tambien cubre el timestamp y el objetivo
+    sealed_fields = SEALED_FIELDS + ('timestamp', 'target')
+    # valores de los bloques guardados antes de que existieran estos campos
+    timestamp = 0.0
+    target = Difficulty.INITIAL_TARGET
 
     def __init__(self, previousBlock):
         super(TxBlock,self).__init__([],previousBlock)
-
+        # altura del bloque en la cadena (el bloque root tiene altura 0)
+        self.height = previousBlock.height + 1 if previousBlock is not None else 0
+        # momento de creacion del bloque y objetivo de dificultad que le corresponde
+        # segun los bloques anteriores
+        self.timestamp = time.time()
+        self.target = Difficulty.next_target(previousBlock)
+        # hashes de las hojas del arbol de Merkle (uno por transaccion) y la raiz incremental
+        self.leaves = []
+        self.merkle = Merkle.MerkleAccumulator()
+
+    # La transaccion debe estar completa (firmada) antes de agregarla, su hash
+    # queda comprometido en la raiz de Merkle del bloque
     def addTx(self, Tx_in):
+        if self.sealed:
+            raise SealedBlockError("Block is sealed, unseal() it before adding transactions")
+        leaf = Merkle.leaf_hash(Tx_in.encode())
         self.data.append(Tx_in)
-
-    ## Encargada de regresar el total de coins recibidos y retirados
+        self.leaves.append(leaf)
+        self.merkle.append(leaf)
+
+    # Raiz de Merkle de las transacciones del bloque
+    def merkle_root(self):
+        return self.merkle.root()
+
+    # Prueba de que una transaccion esta en el bloque: (posicion, cantidad de transacciones, prueba).
+    # Junto a la raiz de Merkle de la cabecera basta para verificarla con verify_inclusion
+    def inclusion_proof(self, tx):
+        leaf = Merkle.leaf_hash(tx.encode())
+        index = self.leaves.index(leaf)
+        return index, len(self.leaves), Merkle.inclusion_proof(self.leaves, index)
+
+    ## Encargada de regresar el total de coins recibidos y retirados,
+    ## en unidades base enteras (ver Columnar.py)
     def __count_totals(self):
-        total_in = 0
-        total_out = 0
-
-        #recorremos las transacciones y listas del bloque...
-        for tx in self.data:
-            for addr, amount in tx.inputs:
-                total_in = total_in + amount
-            for addr, amount in tx.outputs:
-                total_out = total_out + amount
-
-        return total_in,total_out
-
+        return Columnar.TxColumns.from_txs(self.data).totals()
+
+
+    # Verifica las transacciones del bloque repartidas en un pool de hilos.
+    # La verificacion RSA de cryptography libera el GIL, asi que los hilos aprovechan
+    # todos los nucleos. Al encontrar la primera transaccion invalida se cancelan
+    # las verificaciones que aun no empezaron
+    def __txs_valid_parallel(self, workers):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(tx.is_valid) for tx in self.data]
+            for future in as_completed(futures):
+                if not future.result():
+                    for pending in futures:
+                        pending.cancel()
+                    return False
+        return True
 
     # Encargada de evaluar si un bloque de transacciones es valido.
     # Un bloque de transacciones es valido, si cada una de las transacciones son validas
     # y el bloque tambien lo es
+    # Con workers > 1 las transacciones se verifican en paralelo
+
+    def is_valid(self, workers=None):
 
-    def is_valid(self):
+        # Las transacciones deben coincidir con la raiz de Merkle de la cabecera
+        leaves = [Merkle.leaf_hash(tx.encode()) for tx in self.data]
+        if Merkle.merkle_root(leaves) != self.merkle_root():
+            return False
         
         # Se verifican las transacciones
-        for tx in self.data:
-            if not tx.is_valid():
+        if workers is not None and workers > 1:
+            if not self.__txs_valid_parallel(workers):
                 return False
+        else:
+            for tx in self.data:
+                if not tx.is_valid():
+                    return False
 
         #se verifica el hash del bloque
         if not super(TxBlock, self).is_valid():
             return False
 
+        # el objetivo debe ser el que corresponde segun el ajuste de dificultad
+        # (solo se puede comprobar si se conoce el bloque anterior)
+        if (self.previousBlock is not None or self.height == 0) and \
+                self.target != Difficulty.next_target(self.previousBlock):
+            return False
+
+        # el timestamp debe ser mayor que la mediana de los bloques anteriores conocidos
+        # y no estar demasiado en el futuro (ver Difficulty.valid_timestamp)
+        if not Difficulty.valid_timestamp(self.timestamp, self.previousBlock):
+            return False
+
         # Se verifica si un usuario quiere retirar mas monedas
         # de las que existen + una tasa de recompensa para el minero de 25 coins
-        total_in, total_out = self.__count_totals()
+        # una cantidad no finita (NaN, infinito) o fuera de rango hace invalido al bloque
+        try:
+            total_in, total_out = self.__count_totals()
+        except (ValueError, TypeError):
+            return False
 
-        # eliminamos el error de punto flotante de python
-        if total_out - total_in - REWARD > 0.000000000001:
+        # las sumas son enteras, no hace falta tolerancia para el error de punto flotante
+        if total_out - total_in > Columnar.to_units(REWARD):
             return False
             
         return True
 
-    # Encargada de hacer la prueba del algorimo de nonce, algoritmo de los ceros inciales 
-    # en el hash con el que funciona bitcoin
+    # Encargada de hacer la prueba del algorimo de nonce: el hash del bloque
+    # debe ser menor o igual a su objetivo de dificultad
     def good_nonce(self):
-        digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-        digest.update(bytes(str(self.data),'utf8'))
-        digest.update(bytes(str(self.previousHash),'utf8'))
-        digest.update(bytes(str(self.nonce),'utf8'))
-        this_hash = digest.finalize()
-
-        # Pregunta si los n primeros caracterers del hash son distintos a una lista de n caracteres iguales
-        # si son distintos, retorna falso
-        if this_hash[:leading_zeros] != bytes(''.join([ '\x4f' for i in range(leading_zeros)]),'utf8'):
-            return False
+        this_hash = self.computeHash()
+
+        return Difficulty.check_hash(this_hash, self.target)
+
+    # Bytes fijos de la cabecera que se hashean antes del nonce:
+    # version + hash anterior + raiz de Merkle + timestamp + objetivo
+    # (tamaño fijo, sin importar las transacciones)
+    def mining_prefix(self):
+        return Encoding.encode_header(self.previousHash, self.merkle_root(), self.timestamp, self.target)
+
+    # El hash del bloque solo cubre la cabecera (incluido el nonce), las transacciones
+    # quedan cubiertas por la raiz de Merkle
+    def encode(self):
+        return self.mining_prefix() + Encoding.encode_nonce(self.nonce)
 
-        # retorna el booleano resultante de preguntar si el caracter siguiente del hash es menor al 
-        # limite establecido
-        return int(this_hash[leading_zeros]) < next_char_limit
+    # Cabecera compacta del bloque (ver Headers.py), tiene el mismo hash que el bloque
+    def header(self):
+        return BlockHeader(self.previousHash, self.merkle_root(), self.nonce, self.height,
+                           self.timestamp, self.target)
+
+    # Motor de hashing con el prefijo de este bloque ya calculado
+    def hash_engine(self):
+        return HashEngine(self.mining_prefix(), self.target)
 
 
     #####################################
-    def find_nonce(self):
-        for i in range(1000000):
-            self.nonce = ''.join([ 
-                   chr(random.randint(0,255)) for i in range(10*leading_zeros)])
-            if self.good_nonce():
+    # Busca un nonce recorriendo un contador a partir de start
+    def find_nonce(self, attempts=1000000, start=0):
+        nonce, tried = self.hash_engine().search(start, attempts)
+        if nonce is None:
+            return None
+        self.nonce = nonce
+        return self.nonce
+
+    # Modo de minado en paralelo: divide el espacio de nonces entre un pool de procesos.
+    # Cada proceso recorre un rango contiguo de enteros y todos se detienen en cuanto uno
+    # encuentra un nonce valido. Igual que en find_nonce se recorren los nonces
+    # [start, start + attempts). Las estadisticas (intentos por segundo de cada proceso)
+    # quedan en self.mining_stats
+    def find_nonce_parallel(self, workers=None, attempts=1000000, start=0):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        per_worker = -(-attempts // workers)
+
+        # solo se envian a los procesos los bytes fijos del bloque, no la cadena completa
+        prefix = self.mining_prefix()
+
+        manager = multiprocessing.Manager()
+        stop_event = manager.Event()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(stop_event,))
+        try:
+            jobs = [pool.apply_async(_search_range,
+                                     (w, prefix, self.target, start + w * per_worker, per_worker))
+                    for w in range(workers)]
+            results = [job.get() for job in jobs]
+        finally:
+            pool.terminate()
+            manager.shutdown()
+
+        self.mining_stats = [stats for found, stats in results]
+        for found, stats in results:
+            if found is not None:
+                self.nonce = found
                 return self.nonce
         return None
 
@@ -175,30 +349,48 @@ if __name__ == "__main__":
 
     ###################### BUSCANDO NONCE PARA B1 ################################
     start = time.time()
-    print(B1.find_nonce())
+    found = B1.find_nonce()
+    print(found)
 
     # tiempo que tarda "minando"
+    # (para medir el rendimiento del minado ver Benchmark.py)
     elapsed = time.time() - start
     print("elapsed time: " + str(elapsed) + " s.")
     
-    if elapsed < 60:
-        print("ERROR! Mining is too fast")
     if B1.good_nonce():
         print("Success! Nonce is good!")
     else:
         print("ERROR! Bad nonce")
 
+    # Ahora buscamos el nonce repartiendo el trabajo entre todos los nucleos, seguimos desde
+    # donde se detuvo la busqueda secuencial (los nonces anteriores ya se probaron)
+    resume_at = found if found is not None else 1000000
+    start = time.time()
+    print(B1.find_nonce_parallel(start=resume_at))
+    print("parallel elapsed time: " + str(time.time() - start) + " s.")
+    for stats in B1.mining_stats:
+        print("worker " + str(stats['worker']) + ": " + str(int(stats['rate'])) + " attempts/s")
+    if B1.good_nonce():
+        print("Success! Parallel nonce is good!")
+    else:
+        print("ERROR! Bad parallel nonce")
+
     ################################################################################
 
 
-    #Abramos un archivo para guardar el bloque
-    savefile = open("block.dat", "wb")
-    pickle.dump(B1, savefile)
-    savefile.close()
+    #Abramos un almacen de bloques para guardar la cadena, cada bloque se guarda por separado
+    if os.path.exists("block.dat"):
+        os.remove("block.dat")
+    store = BlockStore("block.dat")
+    store.append(root)
+    store.append(B1)
+    store.close()
 
     #como prueba de la integridad de los datos, leeremos del mismo archivo el bloque
-    loadfile = open("block.dat" ,"rb")
-    load_B1 = pickle.load(loadfile)
+    #(enlazado con su bloque anterior)
+    store = BlockStore("block.dat")
+    load_B1 = store.get_linked(1)
+    store.close()
 
     #Imprime los objetos transaccion
     #print(bytes(str(load_B1.data),"utf-8"))
@@ -302,6 +494,22 @@ if __name__ == "__main__":
         print ("Success! Greedy miner detected")
     else:
         print("ERROR! Greedy miner not detected")       
+
+    ################# Pruebas de inclusion (Merkle) ################
+
+    # Para probar que Tx3 esta en B5 basta la raiz de Merkle de la cabecera y la prueba,
+    # no hace falta el bloque completo
+    index, size, proof = B5.inclusion_proof(Tx3)
+    leaf = Merkle.leaf_hash(Tx3.encode())
+    if Merkle.verify_inclusion(leaf, index, size, proof, B5.merkle_root()):
+        print("Success! Tx3 inclusion proof verifies")
+    else:
+        print("ERROR! Tx3 inclusion proof fails")
+
+    if not Merkle.verify_inclusion(Merkle.leaf_hash(Tx5.encode()), index, size, proof, B5.merkle_root()):
+        print("Success! Tx5 is not in B5")
+    else:
+        print("ERROR! Fake inclusion proof verifies")
     
 
     
@@ -324,4 +532,4 @@ luego asegurarse de que las entradas + 25 <= salidas. Es más fácil hacerlo en
 Tenga en cuenta, por supuesto, que TxBlock "hereda" de CBlock, 
 lo que significa que mantiene toda la funcionalidad de CBlock, luego agrega algunas funciones especializadas para un TxBlock.
 
-"""
\ No newline at end of file
+"""
\ No newline at end of file